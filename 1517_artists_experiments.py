@@ -1,7 +1,6 @@
 from csv import DictWriter
 from glob import glob
 from multiprocessing import Process, Manager
-from multiprocessing.managers import BaseManager
 import os
 import pickle
 
@@ -9,7 +8,7 @@ import numpy as np
 import librosa
 from parsing.arff_parsing import parse_arff
 
-from evoaudio.sample_library import SampleLibrary
+from evoaudio.sample_library import SampleLibrary, SharedSampleLibrary
 from evoaudio.base_algorithms import approximate_piece
 from evoaudio.population import Population, ArchiveRecord
 from evoaudio.population_logging import PopulationLogger
@@ -36,9 +35,6 @@ SNAPSHOT_GEN = 500
 
 PARAM_STR = f"{POPSIZE}_{N_OFFSPRING}_{MAX_STEPS}_{ONSET_FRAC}_{ALPHA}_{BETA}_{L_BOUND}_{U_BOUND}_{ZETA}_{PITCH_SHIFT_STD}_1sec"
 
-class LibraryManager(BaseManager):
-    pass
-
 def remove_existing(soundfiles):
     existing = glob(RESULT_FOLDER + PARAM_STR + "/" + "*.pkl")
     existing_names = [os.path.basename(file).split(".")[0] for file in existing]
@@ -78,9 +74,7 @@ if __name__ == "__main__":
     os.makedirs(RESULT_FOLDER + PARAM_STR + "/", exist_ok=True)
     all_soundfiles = glob("./audio/1517-Artists/**/*.mp3", recursive=True)
     soundfiles = remove_existing(all_soundfiles)
-    LibraryManager.register('SampleLibrary', SampleLibrary)
-    with LibraryManager() as manager:
-        shared_lib = manager.SampleLibrary()
+    with SharedSampleLibrary() as shared_lib:
         files_per_proc = len(soundfiles) // MAX_PROCESSES
         processes = [Process(target=run_experiment, args=(
             soundfiles[i*files_per_proc:(i+1)*files_per_proc], 
@@ -0,0 +1,241 @@
+"""Micro-benchmarks of the hot paths of the evolutionary loop.
+
+Runs against a deterministic synthetic sample library and synthetic targets, so no audio files are needed.
+Reports evaluations per second and per-call latency percentiles and saves them as JSON,
+so that optimizations can be compared run over run.
+
+Usage (from the repository root):
+    python -m benchmarks.hot_paths --calls 200 --onsets 100 --output benchmarks/results/run.json
+"""
+from argparse import ArgumentParser
+from datetime import datetime
+import json
+import os
+import platform
+import sys
+import time
+from typing import Callable
+
+import numpy as np
+
+from evoaudio import fitness as fitness_module
+from evoaudio.base_algorithms import _init_population, _step
+from evoaudio.fitness import fitness_cached, multi_onset_fitness_cached
+from evoaudio.individual import BaseIndividual
+from evoaudio.mutations import Mutator
+from evoaudio.population import Population, SteadyStatePopulation
+from evoaudio.target import Target
+from benchmarks.synthetic import make_sample_library, make_target
+
+RESULT_FOLDER = "./benchmarks/results/"
+POPSIZES = [10, 30, 100, 300, 1000, 3000]
+
+def measure(fn:Callable, n_calls:int, setup:Callable=None, teardown:Callable=None) -> dict:
+    """Times n_calls calls of fn. Only fn itself is timed, not setup or teardown.
+
+    Parameters
+    ----------
+    fn : Callable
+        Function to benchmark. Receives the return value of setup as arguments, if setup is given.
+    n_calls : int
+        Number of timed calls.
+    setup : Callable, optional
+        Called before every call of fn, returns a tuple of arguments for fn.
+    teardown : Callable, optional
+        Called after every call of fn.
+
+    Returns
+    -------
+    dict
+        Number of calls, evaluations per second and latency statistics in microseconds.
+    """
+    latencies = np.empty(n_calls)
+    for i in range(n_calls):
+        args = setup() if setup is not None else ()
+        start = time.perf_counter()
+        fn(*args)
+        latencies[i] = time.perf_counter() - start
+        if teardown is not None:
+            teardown()
+    latencies_us = latencies * 1e6
+    return {
+        "calls": n_calls,
+        "evals_per_sec": float(n_calls / np.sum(latencies)),
+        "mean_us": float(np.mean(latencies_us)),
+        "p50_us": float(np.percentile(latencies_us, 50)),
+        "p90_us": float(np.percentile(latencies_us, 90)),
+        "p99_us": float(np.percentile(latencies_us, 99)),
+        "min_us": float(np.min(latencies_us)),
+    }
+
+def fresh_copy(individual:BaseIndividual) -> BaseIndividual:
+    """Copy of an individual without any cached spectra, so that it has to be evaluated from scratch."""
+    copy = BaseIndividual.from_copy(individual)
+    copy.recalc_fitness = True
+    copy.abs_stft = None
+    copy.stft = None
+    return copy
+
+def run_benchmarks(n_calls:int, n_onsets:int, popsize:int, n_offspring:int, seed:int) -> dict:
+    sample_lib = make_sample_library(seed=seed, calc_stft=True)
+    target_y, onsets = make_target(sample_lib, n_onsets=n_onsets, seed=seed)
+    target = Target(target_y, onsets, compact=True)
+    target_fast = Target(target_y, onsets, compact=True, stft_backend="fast")
+    single_onset_target = Target(target_y, onsets[:1])
+    mutator = Mutator(sample_lib)
+
+    np.random.seed(seed)
+    # Individuals with samples that carry no cached stft, to measure the mixdown and FFT paths
+    uncached_lib = make_sample_library(seed=seed)
+    uncached = [BaseIndividual.create_random_individual(uncached_lib) for _ in range(n_calls)]
+    cached = [BaseIndividual.create_random_individual(sample_lib) for _ in range(n_calls)]
+
+    def cycle(individuals, copy=fresh_copy):
+        it = iter(individuals * 2)
+        return lambda: (copy(next(it)),)
+
+    # Evaluated individuals that keep their mix stft, as parents in the population do
+    evaluated = [BaseIndividual.from_copy(individual) for individual in cached]
+    for individual in evaluated:
+        individual.fitness_per_onset = multi_onset_fitness_cached(target, individual)
+        individual.calc_phi_fitness(keep_stft=True)
+
+    results = {}
+    results["to_mixdown"] = measure(lambda ind: ind.to_mixdown(), n_calls, setup=cycle(uncached))
+    results["calc_abs_stft[librosa]"] = measure(lambda ind: ind.calc_abs_stft(), n_calls, setup=cycle(uncached))
+    results["calc_abs_stft[fast]"] = measure(lambda ind: ind.calc_abs_stft(target_fast.stft_backend), n_calls, setup=cycle(uncached))
+    results["calc_abs_stft[sample_stfts]"] = measure(lambda ind: ind.calc_abs_stft(), n_calls, setup=cycle(cached))
+    results["fitness_cached"] = measure(lambda ind: fitness_cached(ind, single_onset_target.abs_stft_per_snippet[onsets[0]]), n_calls, setup=cycle(uncached))
+
+    use_jit = fitness_module.USE_JIT
+    fitness_module.USE_JIT = False
+    results[f"multi_onset_fitness_cached[{n_onsets} onsets, numpy]"] = measure(lambda ind: multi_onset_fitness_cached(target, ind), n_calls, setup=cycle(uncached))
+    fitness_module.USE_JIT = use_jit
+    if use_jit:
+        # Forced on regardless of fitness_module.JIT_MIN_ONSETS, to measure the kernel at every size
+        jit_min_onsets = fitness_module.JIT_MIN_ONSETS
+        fitness_module.JIT_MIN_ONSETS = 0
+        multi_onset_fitness_cached(target, fresh_copy(uncached[0])) # Compile outside of the timing
+        results[f"multi_onset_fitness_cached[{n_onsets} onsets, jit]"] = measure(lambda ind: multi_onset_fitness_cached(target, ind), n_calls, setup=cycle(uncached))
+        fitness_module.JIT_MIN_ONSETS = jit_min_onsets
+    results[f"multi_onset_fitness_cached[{n_onsets} onsets, sample_stfts]"] = measure(lambda ind: multi_onset_fitness_cached(target, ind), n_calls, setup=cycle(cached))
+
+    results["mutate_individual"] = measure(mutator.mutate_individual, n_calls, setup=cycle(evaluated, copy=BaseIndividual.from_copy))
+    results["target_construction[full]"] = measure(lambda: Target(target_y, onsets), max(1, n_calls // 20))
+    results["target_construction[compact]"] = measure(lambda: Target(target_y, onsets, compact=True), max(1, n_calls // 20))
+
+    np.random.seed(seed)
+    population = _init_population(sample_lib=sample_lib, target=target, onset_frac=0.05, popsize=popsize, verbose=False)
+    results["insert_individual"] = measure(population.insert_individual, n_calls, setup=cycle(evaluated, copy=BaseIndividual.from_copy), teardown=lambda: population.remove_worst(1))
+
+    step_mutator = Mutator(sample_lib)
+    results[f"_step[popsize={popsize}, n_offspring={n_offspring}]"] = measure(
+        lambda: _step(population=population, target=target, n_offspring=n_offspring, mutator=step_mutator), n_calls)
+    return results
+
+def run_population_benchmarks(popsizes:list[int], n_calls:int, n_onsets:int, seed:int) -> dict:
+    """Times one steady-state replacement (choose a parent, insert an offspring, remove the worst, get the best)
+    for the list-based Population and the heap-based SteadyStatePopulation.
+    Fitness values are random, so no audio is involved.
+    """
+    rng = np.random.default_rng(seed)
+    def random_individual():
+        individual = BaseIndividual()
+        individual.fitness_per_onset = rng.random(n_onsets)
+        individual.fitness = float(np.mean(individual.fitness_per_onset))
+        return individual
+
+    offspring = [random_individual() for _ in range(n_calls)]
+    results = {}
+    for popsize in popsizes:
+        initial = [random_individual() for _ in range(popsize)]
+        for population_cls in [Population, SteadyStatePopulation]:
+            population = population_cls()
+            population.individuals = list(initial)
+            population.init_archive(list(range(n_onsets)))
+            population.sort_individuals_by_fitness()
+            it = iter(offspring)
+            def replace():
+                population.choose_parents(1)
+                population.insert_individual(next(it))
+                population.remove_worst(1)
+                population.get_best_individual()
+            results[f"replacement[{population_cls.__name__}, popsize={popsize}]"] = measure(replace, n_calls)
+    return results
+
+def check_population_equivalence(popsize:int, n_steps:int, n_onsets:int, seed:int) -> None:
+    """Runs the same steady-state replacements on Population and SteadyStatePopulation and checks that both 
+    keep the same individuals, best individual and archive after every step.
+    Fitness values are rounded, so that ties in the fitness and in the per-onset fitness are common.
+
+    Raises
+    ------
+    AssertionError
+        If the two populations differ.
+    """
+    rng = np.random.default_rng(seed)
+    def random_individual():
+        individual = BaseIndividual()
+        individual.fitness_per_onset = np.round(rng.random(n_onsets), 1)
+        individual.fitness = float(np.round(np.mean(individual.fitness_per_onset), 1))
+        return individual
+
+    initial = [random_individual() for _ in range(popsize)]
+    offspring = [random_individual() for _ in range(n_steps)]
+    populations = [Population(), SteadyStatePopulation()]
+    for population in populations:
+        population.individuals = list(initial)
+        population.init_archive(list(range(n_onsets)))
+        population.sort_individuals_by_fitness()
+
+    def state(population):
+        return ([id(individual) for individual in population.individuals], id(population.get_best_individual()), 
+                sorted(population.fitness_values.tolist()), 
+                [(onset, record.fitness, id(record.individual)) for onset, record in population.archive.items()])
+
+    assert state(populations[0]) == state(populations[1]), "Populations differ after initialization"
+    for step, individual in enumerate(offspring):
+        for population in populations:
+            population.insert_individual(individual)
+            population.remove_worst(1)
+        assert state(populations[0]) == state(populations[1]), f"Populations differ after step {step}"
+
+def environment_info() -> dict:
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "jit": fitness_module.USE_JIT,
+    }
+
+def print_results(results:dict) -> None:
+    name_width = max(len(name) for name in results)
+    print(f"{'benchmark':<{name_width}} {'evals/s':>10} {'p50 us':>10} {'p90 us':>10} {'p99 us':>10}")
+    for name, result in results.items():
+        print(f"{name:<{name_width}} {result['evals_per_sec']:>10.1f} {result['p50_us']:>10.1f} {result['p90_us']:>10.1f} {result['p99_us']:>10.1f}")
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Micro-benchmarks of the evolutionary hot paths on synthetic data.")
+    parser.add_argument("--calls", type=int, default=200, help="Number of timed calls per benchmark.")
+    parser.add_argument("--onsets", type=int, default=100, help="Number of onsets in the synthetic target.")
+    parser.add_argument("--popsize", type=int, default=300, help="Population size for insertion and _step.")
+    parser.add_argument("--n-offspring", type=int, default=1, help="Number of offspring per _step.")
+    parser.add_argument("--popsizes", type=int, nargs="+", default=POPSIZES, help="Population sizes for the replacement benchmark.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=str, default=None, help="JSON file for the results. Defaults to a timestamped file in ./benchmarks/results/.")
+    args = parser.parse_args()
+
+    check_population_equivalence(popsize=min(args.popsizes), n_steps=args.calls, n_onsets=args.onsets, seed=args.seed)
+    results = run_benchmarks(n_calls=args.calls, n_onsets=args.onsets, popsize=args.popsize, n_offspring=args.n_offspring, seed=args.seed)
+    results.update(run_population_benchmarks(popsizes=args.popsizes, n_calls=args.calls, n_onsets=args.onsets, seed=args.seed))
+    print_results(results)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULT_FOLDER, exist_ok=True)
+        output = RESULT_FOLDER + f"hot_paths_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output, "w") as fp:
+        json.dump({"environment": environment_info(), "parameters": vars(args), "results": results}, fp, indent=2)
+    print(f"Saved results to {output}")
@@ -0,0 +1,83 @@
+import numpy as np
+
+from evoaudio.base_sample import BaseSample
+from evoaudio.individual import BaseIndividual
+from evoaudio.pitch import Pitch
+from evoaudio.sample_library import SampleLibrary
+
+SR = 22050
+
+def synthesize_tone(pitch:Pitch, n_harmonics:int, decay:float, length:int, rng:np.random.Generator) -> np.ndarray:
+    """Creates a decaying harmonic tone with a little noise, standing in for a recorded sample.
+    """
+    t = np.arange(length) / SR
+    f0 = 440 * 2 ** ((pitch.value - 69) / 12)
+    harmonics = [(0.6 ** h) * np.sin(2 * np.pi * f0 * (h + 1) * t) for h in range(n_harmonics) if f0 * (h + 1) < SR / 2]
+    y = np.sum(harmonics, axis=0) * np.exp(-decay * t)
+    y += rng.normal(0, 0.005, length)
+    return 0.3 * y / np.max(np.abs(y))
+
+def make_sample_library(n_instruments:int=6, n_styles:int=2, min_pitch:Pitch=Pitch.c3, max_pitch:Pitch=Pitch.c5,
+                        seed:int=0, calc_stft:bool=False, dtype=np.float32) -> SampleLibrary:
+    """Creates a deterministic SampleLibrary of synthetic tones, so that no audio files are needed.
+
+    Parameters
+    ----------
+    n_instruments : int, optional
+        Number of instruments, by default 6
+    n_styles : int, optional
+        Number of styles per instrument, by default 2
+    min_pitch : Pitch, optional
+        Lowest pitch of every style, by default Pitch.c3
+    max_pitch : Pitch, optional
+        Highest pitch of every style, by default Pitch.c5
+    seed : int, optional
+        Seed of the random generator, by default 0
+    calc_stft : bool, optional
+        Passed to SampleLibrary.from_samples, by default False
+    dtype : np.dtype, optional
+        Passed to SampleLibrary.from_samples, by default np.float32
+
+    Returns
+    -------
+    SampleLibrary
+        Library with n_instruments * n_styles * (max_pitch - min_pitch + 1) samples.
+    """
+    rng = np.random.default_rng(seed)
+    samples = []
+    for i in range(n_instruments):
+        for s in range(n_styles):
+            n_harmonics = 2 + (3 * i + s) % 8
+            decay = 0.5 + i + s
+            for pitch_value in range(min_pitch.value, max_pitch.value + 1):
+                length = int(rng.integers(SR // 2, 3 * SR))
+                y = synthesize_tone(Pitch(pitch_value), n_harmonics, decay, length, rng)
+                samples.append(BaseSample(instrument=f"Instrument{i}", style=f"Style{s}", pitch=Pitch(pitch_value), y=y, sr=SR))
+    return SampleLibrary.from_samples(samples, calc_stft=calc_stft, dtype=dtype)
+
+def make_target(sample_lib:SampleLibrary, n_onsets:int, onset_distance:int=SR // 2, seed:int=0) -> tuple[np.ndarray, list[int]]:
+    """Creates a synthetic target piece by placing random sample mixes at regular onsets.
+
+    Parameters
+    ----------
+    sample_lib : SampleLibrary
+        Library to draw the mixes from.
+    n_onsets : int
+        Number of onsets in the piece.
+    onset_distance : int, optional
+        Distance between two onsets in samples, by default half a second.
+    seed : int, optional
+        Seed of numpy's global random state, which the library draws with, by default 0
+
+    Returns
+    -------
+    tuple[np.ndarray, list[int]]
+        Signal of the piece and its onsets in samples.
+    """
+    np.random.seed(seed)
+    onsets = [i * onset_distance for i in range(n_onsets)]
+    y = np.zeros(onsets[-1] + 3 * SR, dtype=sample_lib.get_dtype())
+    for onset in onsets:
+        mix = BaseIndividual.create_random_individual(sample_lib).to_mixdown()
+        y[onset:onset + len(mix)] += mix
+    return y, onsets
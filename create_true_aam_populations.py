@@ -1,7 +1,6 @@
 from glob import glob
 from enum import Enum
 from multiprocessing import Process, Manager
-from multiprocessing.managers import BaseManager
 
 import librosa
 import numpy as np
@@ -11,7 +10,7 @@ from evoaudio.individual import BaseIndividual
 from evoaudio.base_sample import BaseSample, FlatSample
 from evoaudio.population import ArchiveRecord, Population
 from evoaudio.target import Target
-from evoaudio.sample_library import SampleLibrary
+from evoaudio.sample_library import SampleLibrary, SharedSampleLibrary
 from parsing.arff_parsing import parse_arff
 
 N_PROCESSES = 5
@@ -111,9 +110,6 @@ def save_best_population(name:str, sample_lib:SampleLibrary, annotations:dict, t
     pop.save_as_file(f"true_pop_{name}.pkl")
     print(f"{name} done.")
 
-class LibraryManager(BaseManager):
-    pass
-
 def create_sample_set():
     # Create sample set
     mixes = {file.split('_mix.mp3')[0][-4:]: librosa.load(file) for file in glob("./audio/tiny_aam/audio-mixes-mp3/*.mp3")}
@@ -121,9 +117,7 @@ def create_sample_set():
     return annotations, mixes
     
 if __name__ == "__main__":
-    LibraryManager.register('SampleLibrary', SampleLibrary)
-    with LibraryManager() as manager:
-        shared_lib = manager.SampleLibrary()
+    with SharedSampleLibrary() as shared_lib:
     
         annotations, mixes = create_sample_set()
         processes = []
@@ -6,11 +6,13 @@ from tqdm import tqdm
 from .sample_library import SampleLibrary
 from .individual import BaseIndividual
 from .mutations import Mutator
-from .fitness import multi_onset_fitness_cached
-from .population import Population
+from .fitness import FitnessCache, multi_onset_fitness_cached, batch_multi_onset_fitness_cached, additive_multi_onset_fitness
+from .population import Population, SteadyStatePopulation
 from .population_logging import PopulationLogger
 from .target import Target
 
+FITNESS_MODES = ["exact", "additive"]
+
 def approximate_piece_per_onset(target_y:Union[np.ndarray, list], max_steps:int, 
                                 sample_lib:SampleLibrary, popsize:int, n_offspring:int, 
                                 zeta:float=None, early_stopping_fitness:float=None, 
@@ -29,7 +31,9 @@ def approximate_piece(target_y:Union[np.ndarray, list], max_steps:int,
                       sample_lib:SampleLibrary, popsize:int, n_offspring:int, 
                       onset_frac:float, zeta:float=None, early_stopping_fitness:float=None, 
                       population:Population=None, mutator:Mutator=None, logger:PopulationLogger=None, 
-                      onsets:Union[np.ndarray, list]=None, verbose:bool=True, callback:Callable[[Population, int], Any]=None
+                      onsets:Union[np.ndarray, list]=None, verbose:bool=True, callback:Callable[[Population, int], Any]=None,
+                      fitness_cache:FitnessCache=None, stft_backend:Union[str, Callable]="librosa",
+                      fitness_mode:str="exact", steady_state:bool=False, keep_mix_stft:bool=False
                       ) -> Population:
     """Evolutionary approximation of a polyphonic musical piece.
 
@@ -65,24 +69,54 @@ def approximate_piece(target_y:Union[np.ndarray, list], max_steps:int,
         If True, will print a progress bar and additional information to console during each step.
     callback : Callable, optional
         Callback function that receives a population and the current step as input.
+    fitness_cache : FitnessCache, optional
+        Cache of fitness vectors of already evaluated genomes. Must be empty or filled for the same target piece.
+        Its hits and misses counters can be inspected after the run.
+    stft_backend : Union[str, Callable], optional
+        stft implementation used for the target and for evaluating individuals. 
+        'librosa' (reference) or 'fast', or a backend instance such as stft.FastSTFT(workers=4).
+        See stft.get_stft_backend, by default 'librosa'.
+    fitness_mode : str, optional
+        'exact' (default) evaluates every individual by the stft of its mix. 
+        'additive' evaluates by the sum of the samples' precomputed magnitude spectra instead 
+        (see fitness.additive_multi_onset_fitness), which needs no mixdown or stft, 
+        and rescores the final population and archive with the exact fitness (see rescore_exact).
+        Logged fitness values and the population passed to callback are approximate in this mode.
+    steady_state : bool, optional
+        If True, the initial population is a SteadyStatePopulation, which inserts and removes individuals 
+        in O(log n) instead of O(n). Recommended for large populations, by default False.
+    keep_mix_stft : bool, optional
+        If True, every individual keeps the complex stft of its mix, so that offspring update it 
+        incrementally instead of summing their samples' stfts (see BaseIndividual.calc_phi_fitness).
+        Faster mutations in exchange for about 0.35 MiB per individual (complex64), by default False.
 
     Returns
     -------
     Population
         The full population of individual approximations after max_steps of iterations.
+
+    Raises
+    ------
+    ValueError
+        If fitness_mode is unknown.
     """
+    if fitness_mode not in FITNESS_MODES:
+        raise ValueError(f"Unknown fitness mode '{fitness_mode}'. Use one of {FITNESS_MODES}.")
+    if fitness_mode == "additive" and not sample_lib.has_magnitude_sums():
+        sample_lib.calc_sample_magnitude_sums()
     # Initialization
     if mutator is None:
         mutator = Mutator(sample_lib) # Applies mutations and handles stft updates
-    target = Target(target_y, onsets)
+    target = Target(target_y, onsets, compact=True, dtype=sample_lib.get_dtype(), stft_backend=stft_backend) # Fitness only needs the spectral profiles
 
     # Create initial population
     if population is None:
-        population = _init_population(sample_lib=sample_lib, target=target, onset_frac=onset_frac, popsize=popsize, verbose=verbose)
+        population = _init_population(sample_lib=sample_lib, target=target, onset_frac=onset_frac, popsize=popsize, verbose=verbose, fitness_cache=fitness_cache, fitness_mode=fitness_mode, steady_state=steady_state, keep_mix_stft=keep_mix_stft)
 
     # Evolutionary Loop
     for step in (pbar := tqdm(range(max_steps), disable=(not verbose))):
-        done = _step(population=population, target=target, n_offspring=n_offspring, mutator=mutator, zeta=zeta, early_stopping_fitness=early_stopping_fitness, logger=logger, step=step)
+        done = _step(population=population, target=target, n_offspring=n_offspring, mutator=mutator, zeta=zeta, early_stopping_fitness=early_stopping_fitness, logger=logger, step=step, fitness_cache=fitness_cache, 
+                     fitness_mode=fitness_mode, sample_lib=sample_lib, keep_mix_stft=keep_mix_stft)
         if verbose:
             # Update progress bar
             pbar.set_postfix_str(f"Best individual: {str(population.get_best_individual())}")
@@ -92,31 +126,44 @@ def approximate_piece(target_y:Union[np.ndarray, list], max_steps:int,
         if done:
             break
 
+    if fitness_mode == "additive":
+        rescore_exact(population=population, target=target, fitness_cache=fitness_cache)
+
     # Return final population
     return population
 
-def _init_population(sample_lib:SampleLibrary, target:Target, onset_frac:float, popsize:int, verbose:bool) -> Population:
+def _init_population(sample_lib:SampleLibrary, target:Target, onset_frac:float, popsize:int, verbose:bool, fitness_cache:FitnessCache=None, fitness_mode:str="exact", steady_state:bool=False, keep_mix_stft:bool=False) -> Population:
     # Create initial population
-    population = Population()
+    population = SteadyStatePopulation() if steady_state else Population()
     population.individuals = [BaseIndividual.create_random_individual(sample_lib=sample_lib, phi=onset_frac) for _ in tqdm(range(popsize), desc="Initializing Population", disable=(not verbose))]
-    for individual in tqdm(population.individuals, desc="Calculating initial fitness", disable=(not verbose)):
+    for individual in tqdm(population.get_individuals_unsorted(), desc="Calculating initial fitness", disable=(not verbose)):
         # Calc initial fitness
-        individual.fitness_per_onset = multi_onset_fitness_cached(target, individual)
-        individual.calc_phi_fitness()
+        if fitness_mode == "additive":
+            individual.fitness_per_onset = additive_multi_onset_fitness(target, individual, sample_lib)
+        else:
+            individual.fitness_per_onset = multi_onset_fitness_cached(target, individual, fitness_cache)
+        individual.calc_phi_fitness(keep_stft=keep_mix_stft)
     population.init_archive(target.onsets) # Initial record of best approximations of each onset
     population.sort_individuals_by_fitness() # Sort population for easier management
     return population
 
 
-def _step(population:Population, target:Target, n_offspring:int, mutator:Mutator=None, zeta:float=None, early_stopping_fitness:float=None, logger:PopulationLogger=None, step:int=None):
+def _step(population:Population, target:Target, n_offspring:int, mutator:Mutator=None, zeta:float=None, early_stopping_fitness:float=None, logger:PopulationLogger=None, step:int=None, fitness_cache:FitnessCache=None, 
+          fitness_mode:str="exact", sample_lib:SampleLibrary=None, keep_mix_stft:bool=False):
     # Create lambda offspring
-    parents = np.random.choice(population.individuals, size=n_offspring)
+    parents = population.choose_parents(n_offspring)
     offspring = [mutator.mutate_individual(BaseIndividual.from_copy(individual)) for individual in parents]
 
     # Evaluate fitness of offspring
-    for individual in offspring:
-        individual.fitness_per_onset = multi_onset_fitness_cached(target, individual)
-        individual.calc_phi_fitness()
+    if fitness_mode == "additive":
+        fitness_per_onset = [additive_multi_onset_fitness(target, individual, sample_lib) for individual in offspring]
+    elif n_offspring > 1:
+        fitness_per_onset = batch_multi_onset_fitness_cached(target, offspring, fitness_cache)
+    else:
+        fitness_per_onset = [multi_onset_fitness_cached(target, individual, fitness_cache) for individual in offspring]
+    for individual, fitnesses in zip(offspring, fitness_per_onset):
+        individual.fitness_per_onset = fitnesses
+        individual.calc_phi_fitness(keep_stft=keep_mix_stft)
         # Insert individual into population
         population.insert_individual(individual)
     
@@ -136,3 +183,32 @@ def _step(population:Population, target:Target, n_offspring:int, mutator:Mutator
         return True
     else:
         return False
+
+def rescore_exact(population:Population, target:Target, fitness_cache:FitnessCache=None) -> None:
+    """Re-evaluates all individuals of the population and of its archive with the exact fitness,
+    e.g. after a run with approximate fitness values. The archive is rebuilt from the exact fitness
+    of all rescored individuals, since the best individual of an onset under the approximate fitness 
+    need not be the best one under the exact fitness.
+
+    Parameters
+    ----------
+    population : Population
+        Population whose individuals are rescored and whose archive is rebuilt.
+    target : Target
+        Target piece that is being approximated.
+    fitness_cache : FitnessCache, optional
+        Cache of exact fitness vectors for this target.
+    """
+    individuals = list({id(individual): individual for individual in 
+                        population.get_individuals_unsorted() + population.archive.get_unique_individuals()}.values())
+    for individual in individuals:
+        individual.recalc_fitness = True
+        individual.abs_stft = None
+    for individual, fitnesses in zip(individuals, batch_multi_onset_fitness_cached(target, individuals, fitness_cache)):
+        individual.fitness_per_onset = fitnesses
+        individual.calc_phi_fitness()
+    rescored = Population() # Population and former archive individuals, to rebuild the archive from
+    rescored.individuals = individuals
+    rescored.init_archive(target.onsets)
+    population.archive = rescored.archive
+    population.sort_individuals_by_fitness()
@@ -1,14 +1,20 @@
 from typing import Union
 
 from .pitch import Pitch, DrumHit
+from .slots import SlotsPickleMixin
+
+class BaseSample(SlotsPickleMixin):
+    __slots__ = ("instrument", "style", "pitch", "y", "sr", "stft", "id")
+    _slot_defaults = {"stft": None, "id": None} # Attributes that older pickles may lack
 
-class BaseSample:
     def __init__(self, instrument, style, pitch:Union[Pitch, DrumHit], y, sr):
         self.instrument = instrument
         self.style = style
         self.pitch = pitch
         self.y = y
         self.sr = sr
+        self.stft = None # Complex stft of the first second, precomputed by the SampleLibrary if desired
+        self.id = None # Dense id of the sample in its SampleLibrary, see SampleLibrary.assign_sample_ids
     
     def __str__(self):
         return f"({self.instrument}, {self.style}, {self.pitch.name})"
@@ -17,6 +23,8 @@ class BaseSample:
         return self.y
 
 class FlatSample(BaseSample):
+    __slots__ = ()
+
     def __init__(self, instrument, style, pitch:Union[Pitch, DrumHit], y=None, sr=None):
         super().__init__(instrument, style, pitch, y = None, sr = None)
     
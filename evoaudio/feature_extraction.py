@@ -7,7 +7,7 @@ from .sample_library import SampleLibrary
 
 def extract_features_for_window(pop: Population, lib: SampleLibrary, window_start: int, window_end: int) -> np.ndarray:
     ## Grab the onsets in those windows, and the associated best records from the population
-    relevant_collections = [collection for collection in pop.archive.values() if collection.onset >= window_start and collection.onset < window_end]
+    relevant_collections = pop.archive.get_individuals_in_range(window_start, window_end)
 
     ## For each window separately, calculate the maximum, minimum, and mean fitnesses for each occasion of
     ## An instrument
@@ -15,9 +15,8 @@ def extract_features_for_window(pop: Population, lib: SampleLibrary, window_star
     
     ## A pitch
     pitch_occurrences_fitness = dict()
-    for record in relevant_collections:
-        collection = record.individual
-        for sample in collection.samples:
+    for collection in relevant_collections:
+        for sample in collection.iter_samples():
             if sample.instrument in instrument_occurrences_fitness:
                 instrument_occurrences_fitness[sample.instrument].append(collection.fitness)
             else:
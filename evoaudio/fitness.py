@@ -1,9 +1,20 @@
+from collections import OrderedDict
+
 import numpy as np
 import librosa
 
 from .individual import BaseIndividual
+from .sample_library import SampleLibrary
+from .kernels import NUMBA_AVAILABLE, cosh_distance_multi_jit
+from .stft import SNIPPET_LENGTH, n_frames, get_stft_backend
 from .target import Target
 
+USE_JIT = NUMBA_AVAILABLE # Use the compiled cosh distance kernel if numba is installed
+JIT_MIN_ONSETS = 50 # Below this number of onsets the stft dominates and the kernel gives no measurable speedup
+
+def _use_jit(n_onsets:int) -> bool:
+    return USE_JIT and n_onsets >= JIT_MIN_ONSETS
+
 def cosh_distance(stft_x, stft_y):
     a = np.average(abs(stft_x), axis=1)
     b = np.average(abs(stft_y), axis=1)
@@ -28,9 +39,85 @@ def cosh_distance_no_abs(abs_stft_x, abs_stft_y) -> float:
     b = np.average(abs_stft_y, axis=1)
     return np.sum(a/b - np.log(a/b) + b/a - np.log(b/a) - 2) / len(a)
 
-def fitness(x, y) -> float:
-    stft_x = librosa.stft(x)
-    stft_y = librosa.stft(y)
+def cosh_distance_multi(abs_stft_x, spectral_profiles) -> np.ndarray:
+    """Calculates the cosh-distance between one magnitude spectrum x
+    and many time-averaged magnitude spectra in a single broadcast operation.
+    Uses the fused numba kernel (kernels.cosh_distance_multi_jit) if USE_JIT is set 
+    and there are at least JIT_MIN_ONSETS profiles.
+
+    Parameters
+    ----------
+    abs_stft_x : np.ndarray[float]
+        Absolute stft values (magnitude spectrum) for x
+    spectral_profiles : np.ndarray[float]
+        Time-averaged magnitude spectra of shape (n_onsets, n_bins), see Target.spectral_profiles
+
+    Returns
+    -------
+    np.ndarray
+        Cosh distance between x and each of the profiles.
+    """
+    if _use_jit(len(spectral_profiles)):
+        return cosh_distance_multi_jit(abs_stft_x, spectral_profiles)
+    return cosh_distance_profiles(np.average(abs_stft_x, axis=1), spectral_profiles)
+
+def cosh_distance_profiles(a, b) -> np.ndarray:
+    """Calculates the cosh-distance between time-averaged magnitude spectra.
+    Leading dimensions of a and b are broadcast against each other.
+
+    Parameters
+    ----------
+    a : np.ndarray[float]
+        Time-averaged magnitude spectra of shape (..., n_bins)
+    b : np.ndarray[float]
+        Time-averaged magnitude spectra of shape (..., n_bins)
+
+    Returns
+    -------
+    np.ndarray
+        Cosh distances of shape broadcast(a, b)[:-1].
+    """
+    return np.sum(a/b - np.log(a/b) + b/a - np.log(b/a) - 2, axis=-1) / a.shape[-1]
+
+def precision_deviation(target:Target, individuals:list[BaseIndividual], dtype=np.float32) -> float:
+    """Accuracy check of a reduced precision against the float64 path.
+    Evaluates each individual's mix with both precisions and returns the largest 
+    relative deviation of the per-onset fitness values.
+    The target is evaluated in both precisions as well, so it should be 
+    created with calc_stft=True and a float64 signal.
+
+    With np.float32 (the precision librosa.load returns by default) the 
+    deviation is typically below 1e-5, i.e. far below the fitness
+    differences that decide selection.
+
+    Parameters
+    ----------
+    target : Target
+        Target piece with float64 signal.
+    individuals : list[BaseIndividual]
+        Individuals to evaluate.
+    dtype : np.dtype, optional
+        Reduced precision to check, by default np.float32.
+
+    Returns
+    -------
+    float
+        Maximum relative deviation from the float64 fitness values.
+    """
+    target_reduced = Target(target.y, target.onsets, compact=True, dtype=dtype, stft_backend=target.stft_backend)
+    target_reference = Target(target.y, target.onsets, compact=True, dtype=np.float64, stft_backend=target.stft_backend)
+    deviation = 0.0
+    for individual in individuals:
+        mix = individual.to_mixdown(length=SNIPPET_LENGTH)
+        reference = cosh_distance_multi(np.abs(target.stft_backend(mix.astype(np.float64))), target_reference.spectral_profiles)
+        reduced = cosh_distance_multi(np.abs(target.stft_backend(mix.astype(dtype))), target_reduced.spectral_profiles)
+        deviation = max(deviation, np.max(np.abs(reduced - reference) / np.abs(reference)))
+    return deviation
+
+def fitness(x, y, stft_backend=None) -> float:
+    stft = get_stft_backend(stft_backend)
+    stft_x = stft(x)
+    stft_y = stft(y)
     return cosh_distance(stft_x, stft_y)
 
 def fitness_cached(sample: BaseIndividual, target_stft: np.ndarray) -> float:
@@ -52,7 +139,53 @@ def fitness_cached(sample: BaseIndividual, target_stft: np.ndarray) -> float:
         sample.calc_abs_stft()
     return cosh_distance_no_abs(sample.abs_stft, target_stft)
 
-def multi_onset_fitness_cached(target:Target, individual:BaseIndividual) -> np.ndarray:
+class FitnessCache:
+    """Bounded cache of per-onset fitness vectors, keyed by BaseIndividual.genome_key().
+    The least recently used entry is evicted once maxsize is exceeded.
+    A cache is only valid for the single target it was filled with.
+    """
+    def __init__(self, maxsize:int=10000) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict() # genome key: fitness vector, ordered from least to most recently used
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups > 0 else 0.0
+
+    def get(self, key:tuple) -> np.ndarray:
+        """Returns the cached fitness vector for a genome key, or None if it is not cached.
+        The vector is read-only, since it is shared by every individual with the same genome.
+        """
+        fitnesses = self._entries.get(key)
+        if fitnesses is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._entries.move_to_end(key)
+        return fitnesses
+
+    def put(self, key:tuple, fitnesses:np.ndarray) -> None:
+        """Stores the fitness vector for a genome key, evicting the least recently used entry if necessary.
+        """
+        fitnesses = np.array(fitnesses)
+        fitnesses.setflags(write=False) # Handed out to several individuals, see get
+        self._entries[key] = fitnesses
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+def multi_onset_fitness_cached(target:Target, individual:BaseIndividual, cache:FitnessCache=None) -> np.ndarray:
     """Returns a vector of fitness values. One for each onset in target.
 
     Parameters
@@ -61,6 +194,9 @@ def multi_onset_fitness_cached(target:Target, individual:BaseIndividual) -> np.n
         Target piece that is being approximated.
     individual : SampleCollection
         Candidate individual.
+    cache : FitnessCache, optional
+        Cache of already evaluated genomes for this target. 
+        Consulted before any mixdown or stft is calculated.
 
     Returns
     -------
@@ -68,14 +204,115 @@ def multi_onset_fitness_cached(target:Target, individual:BaseIndividual) -> np.n
         Vector of fitness values for each onset.
     """
     if individual.recalc_fitness:
-        fitnesses = []
-        for onset in target.onsets:
+        if cache is not None:
+            key = individual.genome_key()
+            fitnesses = cache.get(key)
+            if fitnesses is not None:
+                return fitnesses
         # NOTE: Here we are NOT cutting the sample 
         # to the same size as the target snippet
-            target_abs_stft = target.abs_stft_per_snippet[onset]
-            fitness = fitness_cached(individual, target_abs_stft)
-            fitnesses.append(fitness)
-            
-        return np.array(fitnesses)
+        if individual.abs_stft is None:
+            individual.calc_abs_stft(target.stft_backend)
+        fitnesses = cosh_distance_multi(individual.abs_stft, target.spectral_profiles)
+        if cache is not None:
+            cache.put(key, fitnesses)
+        return fitnesses
     else:
-        return individual.fitness_per_onset
\ No newline at end of file
+        return individual.fitness_per_onset
+
+def additive_abs_spectrum(individual:BaseIndividual, sample_lib:SampleLibrary) -> np.ndarray:
+    """Approximates the time-averaged magnitude spectrum of an individual's mix 
+    by the sum of its samples' magnitude spectra (see SampleLibrary.calc_sample_magnitude_sums),
+    averaged over the frames of the mix. No mixdown or stft is calculated.
+    Exact for a single sample, an upper bound otherwise, since |a + b| <= |a| + |b| for every bin.
+
+    Parameters
+    ----------
+    individual : BaseIndividual
+        Individual whose samples carry their library ids.
+    sample_lib : SampleLibrary
+        Library with precomputed magnitude sums.
+
+    Returns
+    -------
+    np.ndarray
+        Approximate time-averaged magnitude spectrum of shape (n_bins,).
+    """
+    genome = individual.genome
+    return sample_lib.sample_magnitude_sums[genome].sum(axis=0) / sample_lib.sample_n_frames[genome].max()
+
+def additive_multi_onset_fitness(target:Target, individual:BaseIndividual, sample_lib:SampleLibrary) -> np.ndarray:
+    """Approximate version of multi_onset_fitness_cached based on additive_abs_spectrum, 
+    which costs O(n_samples * n_bins) for the spectrum instead of a mixdown and an stft. 
+    Meant for cheap exploration, with the final results rescored by the exact fitness.
+
+    Parameters
+    ----------
+    target : Target
+        Target piece that is being approximated.
+    individual : BaseIndividual
+        Candidate individual.
+    sample_lib : SampleLibrary
+        Library with precomputed magnitude sums.
+
+    Returns
+    -------
+    np.ndarray
+        Vector of approximate fitness values for each onset.
+    """
+    if not individual.recalc_fitness:
+        return individual.fitness_per_onset
+    spectrum = additive_abs_spectrum(individual, sample_lib)
+    return cosh_distance_multi(spectrum[:, np.newaxis], target.spectral_profiles)
+
+def batch_multi_onset_fitness_cached(target:Target, individuals:list[BaseIndividual], cache:FitnessCache=None) -> np.ndarray:
+    """Returns a matrix of fitness values for several individuals. One row per individual, one column per onset.
+    The mixes of all individuals that need a new stft are stacked into one 
+    array and transformed by a single call of the target's stft backend.
+
+    Parameters
+    ----------
+    target : Target
+        Target piece that is being approximated.
+    individuals : list[BaseIndividual]
+        Candidate individuals.
+    cache : FitnessCache, optional
+        Cache of already evaluated genomes for this target.
+
+    Returns
+    -------
+    np.ndarray
+        Matrix of shape (len(individuals), len(target.onsets)).
+    """
+    fitnesses = np.empty((len(individuals), len(target.spectral_profiles)))
+    batch = [] # Indices of the individuals that are evaluated in the batch
+    for i, individual in enumerate(individuals):
+        if individual.recalc_fitness and individual.abs_stft is None and not individual.has_sample_stfts():
+            cached_fitnesses = cache.get(individual.genome_key()) if cache is not None else None
+            if cached_fitnesses is None:
+                batch.append(i)
+            else:
+                fitnesses[i] = cached_fitnesses
+        else:
+            fitnesses[i] = multi_onset_fitness_cached(target, individual, cache)
+
+    if len(batch) > 0:
+        mixes = [individuals[i].to_mixdown(length=SNIPPET_LENGTH) for i in batch]
+        # Zero-padding to the snippet length leaves the first n_frames(len(mix)) frames unchanged
+        stacked_mixes = np.zeros((len(mixes), SNIPPET_LENGTH), dtype=mixes[0].dtype)
+        for row, mix in enumerate(mixes):
+            stacked_mixes[row, :len(mix)] = mix
+        abs_stfts = np.abs(target.stft_backend(stacked_mixes)) # Shape (n_batch, n_bins, n_frames)
+        # Average each spectrum over the frames of its unpadded mix only
+        frames = np.array([n_frames(len(mix)) for mix in mixes])
+        if _use_jit(len(target.spectral_profiles)):
+            for row, i in enumerate(batch):
+                fitnesses[i] = cosh_distance_multi_jit(abs_stfts[row], target.spectral_profiles, frames[row])
+        else:
+            frame_mask = np.arange(abs_stfts.shape[-1]) < frames[:, np.newaxis]
+            a = np.sum(abs_stfts * frame_mask[:, np.newaxis, :], axis=-1) / frames[:, np.newaxis]
+            fitnesses[batch] = cosh_distance_profiles(a[:, np.newaxis, :], target.spectral_profiles[np.newaxis, :, :])
+        if cache is not None:
+            for i in batch:
+                cache.put(individuals[i].genome_key(), fitnesses[i])
+    return fitnesses
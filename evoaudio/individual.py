@@ -1,33 +1,85 @@
-from copy import copy
+from typing import Callable, Iterator
 
 import numpy as np
 import librosa
 
 from .sample_library import SampleLibrary
 from .base_sample import BaseSample
+from .slots import SlotsPickleMixin
+from .stft import SNIPPET_LENGTH, n_frames
 
 INITIAL_N_SAMPLES_P = [0.1, 0.3, 0.3, 0.2, 0.1]
+MAX_STFT_UPDATES = 100 # Number of incremental stft updates before the mix stft is summed from scratch again
 
-class BaseIndividual:
-    samples: list[BaseSample]
-    phi: float
-    fitness_per_onset: list[float]
-    fitness: float
-    recalc_fitness: bool
-    abs_stft: np.ndarray
+class BaseIndividual(SlotsPickleMixin):
+    __slots__ = ("_samples", "_samples_shared", "phi", "fitness_per_onset", "fitness", "recalc_fitness", "abs_stft", "stft", "n_stft_updates")
+    _slot_defaults = {"_samples_shared": False, "abs_stft": None, "stft": None, "n_stft_updates": 0} # Attributes that older pickles may lack
 
     def __init__(self, phi:float=0.1):
-        self.samples = [] # List of samples in the collection
+        self._samples = [] # List of samples in the collection, see self.samples
+        self._samples_shared = False # True while self._samples may be shared with copies of this individual
         self.phi = phi # Fraction of onsets that form the basis of overall fitness for this individual 
-        self.fitness_per_onset = [] # Vector of fitnesses per onset
+        self.fitness_per_onset = np.empty(0) # Vector of fitnesses per onset
         self.fitness = np.inf # Mean fitness to top φ% of approximated onsets
         self.recalc_fitness = True # True if sample has been modified but fitness has yet to be recalculated
         self.abs_stft = None # Absolute stft values for fitness calculation
+        self.stft = None # Complex stft of the mix, summed from the samples' cached stfts and updated incrementally on mutation
+        self.n_stft_updates = 0 # Number of incremental updates applied to self.stft since it was last summed from scratch
     
     def __str__(self):
-        s = f"Fitness: {self.fitness} | " + ", ".join(str(x) for x in self.samples)
+        s = f"Fitness: {self.fitness} | " + ", ".join(str(x) for x in self._samples)
         return s
 
+    @property
+    def samples(self) -> list[BaseSample]:
+        """List of samples in the collection. 
+        Copies made by from_copy share their parent's list until either one is modified,
+        so reading it here makes it private to this individual first, since callers may modify it.
+        For the same reason, it drops the cached mix stft, which is then summed from scratch on the next evaluation.
+        Use get_sample, get_n_samples and iter_samples for read-only access, 
+        and append_sample, remove_sample and replace_sample to update the mix stft incrementally.
+        """
+        self._own_samples()
+        self._invalidate_stft()
+        return self._samples
+
+    @samples.setter
+    def samples(self, samples:list[BaseSample]) -> None:
+        self._samples = samples
+        self._samples_shared = False
+        self._invalidate_stft()
+
+    def _invalidate_stft(self) -> None:
+        # The sample list may change without going through append_sample, remove_sample or replace_sample
+        self.stft = None
+        self.abs_stft = None
+        self.n_stft_updates = 0
+
+    def _own_samples(self) -> None:
+        # Copy on write: gives this individual its own list of samples
+        if self._samples_shared:
+            self._samples = list(self._samples)
+            self._samples_shared = False
+
+    def get_sample(self, idx:int) -> BaseSample:
+        """Returns the sample at idx without copying a shared sample list.
+        """
+        return self._samples[idx]
+
+    def get_n_samples(self) -> int:
+        """Returns the number of samples in the collection.
+        """
+        return len(self._samples)
+
+    def iter_samples(self) -> Iterator[BaseSample]:
+        """Iterates over the samples without copying a shared sample list. The collection must not be modified meanwhile.
+        """
+        return iter(self._samples)
+
+    def __setstate__(self, state):
+        super().__setstate__(state) # Older pickles set "samples", which goes through its setter
+        self.fitness_per_onset = np.asarray(self.fitness_per_onset, dtype=np.float64) # Older pickles store a list
+
     # def calc_abs_stft(self) -> None:
     #     """Calculates the absolute stft values of the sample mix.
     #     """
@@ -35,16 +87,131 @@ class BaseIndividual:
     #     self.abs_stft = np.abs(stft)
     #     self.recalc_fitness = True
 
-    def calc_abs_stft(self) -> None:
+    def calc_abs_stft(self, stft_backend:Callable[[np.ndarray], np.ndarray]=None) -> None:
         # Version with 1-second snippets (Ginsel et. al 2022)
         """Calculates the absolute stft values of the sample mix.
+        If all samples carry a precomputed stft (see SampleLibrary.calc_sample_stfts),
+        the stft of the mix is obtained by summing them instead of calling librosa.stft.
+        The sum is kept in self.stft, so that mutations can update it incrementally.
+
+        Parameters
+        ----------
+        stft_backend : Callable, optional
+            Function that calculates the complex stft of the mix, see stft.get_stft_backend.
+            Uses librosa.stft if None.
         """
-        stft = librosa.stft(self.to_mixdown()[:22050])
+        if self.has_sample_stfts():
+            if self.stft is None:
+                self.stft = self.sum_sample_stfts()
+                self.n_stft_updates = 0
+            stft = self.stft[:, :n_frames(max(len(sample.y) for sample in self._samples))]
+        else:
+            if stft_backend is None:
+                stft_backend = librosa.stft
+            stft = stft_backend(self.to_mixdown(length=SNIPPET_LENGTH))
         self.abs_stft = np.abs(stft)
         self.recalc_fitness = True
 
-    def calc_phi_fitness(self) -> None:
+    def has_sample_stfts(self) -> bool:
+        """Returns True if the stft of every sample in the collection has been precomputed.
+        """
+        return all(getattr(sample, "stft", None) is not None for sample in self._samples)
+
+    def sum_sample_stfts(self) -> np.ndarray:
+        """Calculates the complex stft of the sample mix by superposition of the samples' cached stfts.
+        Since the stft is linear, its first n_frames(len(mix)) frames 
+        equal librosa.stft(self.to_mixdown()[:SNIPPET_LENGTH]).
+
+        Returns
+        -------
+        np.ndarray
+            Complex stft of the first second of the mix, zero-padded to SNIPPET_LENGTH.
+        """
+        stft = self._samples[0].stft.copy()
+        for sample in self._samples[1:]:
+            stft += sample.stft
+        return stft
+
+    def append_sample(self, sample:BaseSample) -> None:
+        """Adds a sample to the collection, updating the mix stft if it is known.
+
+        Parameters
+        ----------
+        sample : BaseSample
+            Sample to add.
+        """
+        self._own_samples()
+        self._samples.append(sample)
+        self._update_stft(removed=None, added=sample)
+
+    def remove_sample(self, idx:int) -> BaseSample:
+        """Removes the sample at idx from the collection, updating the mix stft if it is known.
+
+        Parameters
+        ----------
+        idx : int
+            Index of the sample to remove.
+
+        Returns
+        -------
+        BaseSample
+            The removed sample.
+        """
+        self._own_samples()
+        removed = self._samples.pop(idx)
+        self._update_stft(removed=removed, added=None)
+        return removed
+
+    def replace_sample(self, idx:int, sample:BaseSample) -> None:
+        """Replaces the sample at idx, updating the mix stft if it is known.
+
+        Parameters
+        ----------
+        idx : int
+            Index of the sample to replace.
+        sample : BaseSample
+            New sample.
+        """
+        self._own_samples()
+        removed = self._samples[idx]
+        self._samples[idx] = sample
+        self._update_stft(removed=removed, added=sample)
+
+    def _update_stft(self, removed:BaseSample, added:BaseSample) -> None:
+        """Updates the mix stft by subtracting the stft of the removed sample and adding that of the added one.
+        Invalidates it instead if one of them carries no cached stft, or if too many
+        incremental updates have accumulated rounding errors.
+        """
+        self.abs_stft = None
+        self.recalc_fitness = True
+        if self.stft is None:
+            return
+        if ((removed is not None and removed.stft is None) 
+            or (added is not None and added.stft is None)
+            or self.n_stft_updates >= MAX_STFT_UPDATES):
+            self.stft = None
+            return
+        # Never write into self.stft in place, copies of this individual may share the array
+        if removed is not None and added is not None:
+            stft = self.stft - removed.stft
+            stft += added.stft
+        elif removed is not None:
+            stft = self.stft - removed.stft
+        else:
+            stft = self.stft + added.stft
+        self.stft = stft
+        self.n_stft_updates += 1
+
+    def calc_phi_fitness(self, keep_stft:bool=False) -> None:
         """Calculates the fitness of the len(samples)*phi best onsets.
+
+        Parameters
+        ----------
+        keep_stft : bool, optional
+            If True, the complex mix stft (self.stft) is kept, so that copies of this individual 
+            can update it incrementally on mutation instead of summing it again.
+            Costs one complex (1 + N_FFT // 2) x n_frames(SNIPPET_LENGTH) matrix per individual 
+            (about 0.35 MiB for complex64), by default False.
         """
         n_onsets = int(np.ceil(len(self.fitness_per_onset) * self.phi)) # Number of onsets to include
         partition_idx = np.argpartition(self.fitness_per_onset, n_onsets-1) # Indices of the included onsets
@@ -52,23 +219,65 @@ class BaseIndividual:
         self.fitness = np.mean(top_fitnesses) 
         self.recalc_fitness = False
         self.abs_stft = None # Memory optimization
+        if not keep_stft:
+            self.stft = None
+
+    @property
+    def genome(self) -> np.ndarray:
+        """Sample ids of the collection (see SampleLibrary.assign_sample_ids), in the order of self.samples.
+        """
+        return np.fromiter((sample.id for sample in self._samples), dtype=np.int32, count=len(self._samples))
+
+    def has_sample_ids(self) -> bool:
+        """Returns True if every sample in the collection carries its library id.
+        """
+        return all(getattr(sample, "id", None) is not None for sample in self._samples)
+
+    def genome_key(self) -> tuple:
+        """Returns a canonical key of the samples in the collection.
+        The key is independent of the order of the samples, so two individuals 
+        with the same multiset of samples share the same key.
+
+        Returns
+        -------
+        tuple
+            Sorted tuple of the sample ids, or of (instrument, style, pitch) tuples 
+            if the samples do not come from a SampleLibrary.
+        """
+        if self.has_sample_ids():
+            return tuple(sorted(sample.id for sample in self._samples))
+        return tuple(sorted((sample.instrument, sample.style, int(sample.pitch)) for sample in self._samples))
 
-    def to_mixdown(self) -> np.ndarray:
+    def to_mixdown(self, length:int=None) -> np.ndarray:
         """Creates a mix of the samples contained in the collection.
 
+        Parameters
+        ----------
+        length : int, optional
+            If given, the mix is cut to at most length samples 
+            and no audio of the samples beyond it is read.
+
         Returns
         -------
         np.ndarray
-            Mix of the samples.
+            Mix of the samples, as long as the longest sample (or length).
         """
-        # Resize by expanding all samples to the same length
-        max_length = np.max([len(sample.y) for sample in self.samples])
-        ys_equal_length = [np.pad(sample.y, (0, max_length - len(sample.y))) for sample in self.samples]
-        return np.sum(ys_equal_length, axis=0)
+        max_length = max(len(sample.y) for sample in self._samples)
+        if length is not None:
+            max_length = min(max_length, length)
+        # Shorter samples are implicitly zero-padded by adding them onto a buffer of the full length
+        mix = np.zeros(max_length, dtype=np.result_type(*(sample.y for sample in self._samples)))
+        for sample in self._samples:
+            n = min(len(sample.y), max_length)
+            mix[:n] += sample.y[:n]
+        return mix
 
     @classmethod
     def from_copy(cls, obj):
         """Efficiently creates a copy of the given Individual.
+        The copy shares the list of samples and the fitness vector of the original (copy on write):
+        the list is only copied once either individual modifies it (see self.samples), 
+        and fitness vectors are always replaced, never modified in place.
 
         Parameters
         ----------
@@ -81,14 +290,39 @@ class BaseIndividual:
             Equivalent copy of the Individual that can be modified without modifying the original.
         """
         instance = cls()
-        instance.samples = [copy(sample) for sample in obj.samples] # Copies only the reference to a sample for better performance.
+        instance._samples = obj._samples # Shared until either individual modifies it, see _own_samples
+        instance._samples_shared = obj._samples_shared = True
         instance.phi = obj.phi
-        instance.fitness_per_onset = [fitness for fitness in obj.fitness_per_onset]
+        instance.fitness_per_onset = obj.fitness_per_onset
         instance.recalc_fitness = obj.recalc_fitness
         instance.fitness = obj.fitness
         instance.abs_stft = obj.abs_stft
+        instance.stft = obj.stft # Shared, since it is only ever replaced and never modified in place
+        instance.n_stft_updates = obj.n_stft_updates
         return instance
 
+    @classmethod
+    def from_genome(cls, genome:np.ndarray, sample_lib:SampleLibrary, phi:float=0.1):
+        """Creates an individual from an array of sample ids.
+
+        Parameters
+        ----------
+        genome : np.ndarray[int]
+            Sample ids, see BaseIndividual.genome.
+        sample_lib : SampleLibrary
+            Library the ids refer to.
+        phi : float, optional
+            Fraction of onsets that affect fitness calculation, by default 0.1.
+
+        Returns
+        -------
+        BaseIndividual
+            Individual with the samples of the given ids, that has yet to be evaluated.
+        """
+        individual = cls(phi=phi)
+        individual.samples = [sample_lib.get_sample_by_id(int(sample_id)) for sample_id in genome]
+        return individual
+
     @classmethod
     def create_random_individual(cls, sample_lib:SampleLibrary, max_samples:int=5, sample_num_p:list[float]=INITIAL_N_SAMPLES_P, phi:float=0.1):
         """Creates an individual from a sample library and given parameters.
@@ -112,5 +346,5 @@ class BaseIndividual:
         """
         individual = cls(phi=phi)
         for _ in range(np.random.choice(list(range(max_samples)), p=sample_num_p) + 1):
-            individual.samples.append(sample_lib.get_random_sample_uniform())
+            individual.append_sample(sample_lib.get_random_sample_uniform())
         return individual
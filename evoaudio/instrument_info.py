@@ -1,11 +1,19 @@
-from .pitch import Pitch
+from typing import Union
 
-class InstrumentInfo:
+import numpy as np
+
+from .pitch import Pitch, DrumHit
+from .slots import SlotsPickleMixin
+
+class InstrumentInfo(SlotsPickleMixin):
+    __slots__ = ("name", "styles", "pitches", "min_pitches", "max_pitches", "valid_pitches", "valid_pitch_values")
     name: str
     styles: set[str]
     pitches: dict[str, list[Pitch]]
     min_pitches: dict[str, Pitch]
     max_pitches: dict[str, Pitch]
+    valid_pitches: dict[str, list[Pitch]]
+    valid_pitch_values: dict[str, np.ndarray]
     
     def __init__(self, name:str, styles:set, pitches:dict):
         self.name = name # Instrument name string
@@ -13,11 +21,49 @@ class InstrumentInfo:
         self.pitches = pitches # Dict of pairs {style: {B2, A2, Ais2, ...}}
         self.min_pitches = dict() # Lowest possible pitch per style
         self.max_pitches = dict() # Highest possible pitch per style
+        self.valid_pitches = dict() # Sorted list of the known pitches per style
+        self.valid_pitch_values = dict() # Sorted array of the known pitch values per style, for binary search
     
     def calc_min_max_pitches(self):
         for style in self.styles:
                 self.min_pitches[style] = min(self.pitches[style])
                 self.max_pitches[style] = max(self.pitches[style])
+        self.calc_valid_pitches()
+
+    def calc_valid_pitches(self):
+        for style in self.styles:
+            self.valid_pitches[style] = sorted(self.pitches[style])
+            self.valid_pitch_values[style] = np.array([pitch.value for pitch in self.valid_pitches[style]])
+
+    def nearest_valid_pitch(self, style:str, pitch_value:Union[int, float]) -> Union[Pitch, DrumHit]:
+        """Returns the known pitch of a style that is closest to pitch_value, found by binary search.
+        Values outside of the style's range are clipped to its lowest or highest pitch.
+        Ties are resolved towards the lower pitch.
+
+        Parameters
+        ----------
+        style : str
+            Style of this instrument.
+        pitch_value : Union[int, float]
+            Desired pitch value, e.g. a shifted MIDI note number.
+
+        Returns
+        -------
+        Union[Pitch, DrumHit]
+            Closest pitch for which the style has a sample.
+
+        Raises
+        ------
+        KeyError
+            If the style is not known for this instrument.
+        """
+        values = self.valid_pitch_values[style]
+        idx = int(np.searchsorted(values, pitch_value))
+        if idx == len(values):
+            idx -= 1
+        elif idx > 0 and pitch_value - values[idx - 1] <= values[idx] - pitch_value:
+            idx -= 1
+        return self.valid_pitches[style][idx]
 
     def __str__(self) -> str:
-        return f"Instrument Name: {self.name}, Instrument Styles: {self.styles}, Known Pitches: {self.pitches}"
\ No newline at end of file
+        return f"Instrument Name: {self.name}, Instrument Styles: {self.styles}, Known Pitches: {self.pitches}"
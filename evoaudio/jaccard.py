@@ -17,21 +17,21 @@ class class_mode(Enum):
 
 def extract_instruments(individual:BaseIndividual):
     seen_instruments = []
-    for sample in individual.samples:
+    for sample in individual.iter_samples():
         if sample.instrument not in seen_instruments:
             seen_instruments.append(sample.instrument)
     return seen_instruments
 
 def extract_pitches(individual:BaseIndividual):
     seen_pitches = []
-    for sample in individual.samples:
+    for sample in individual.iter_samples():
         if sample.pitch not in seen_pitches:
             seen_pitches.append(sample.pitch)
     return seen_pitches
 
 def extract_samples(individual:BaseIndividual):
     seen_samples = []
-    for sample in individual.samples:
+    for sample in individual.iter_samples():
         if (sample.instrument, sample.pitch) not in seen_samples:
             seen_samples.append((sample.instrument, str(sample.pitch.value)))
     return seen_samples
@@ -55,8 +55,7 @@ def jaccard_error(population:Population, annotations:dict, mode:class_mode) -> f
     """
     time_onsets = list(annotations.keys())
     jaccard_errors_per_onset = []
-    for i, onset in enumerate(population.archive):
-        individual = population.archive[onset].individual
+    for i, individual in enumerate(population.archive.get_best_individuals()):
         time_onset = time_onsets[i]
         match mode:
             case class_mode.INSTRUMENTS:
@@ -0,0 +1,62 @@
+import numpy as np
+
+try:
+    import numba
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+def _cosh_distance_multi_kernel(abs_stft_x, spectral_profiles, n_frames, out):
+    """Fused cosh distance between one magnitude spectrum and many time-averaged magnitude spectra.
+    Averages the first n_frames frames of abs_stft_x and accumulates
+    a/b - log(a/b) + b/a - log(b/a) - 2 per onset without any full-size temporaries.
+    The result is written to out, which must have length n_onsets.
+    """
+    n_bins = abs_stft_x.shape[0]
+    n_onsets = spectral_profiles.shape[0]
+    a = np.empty(n_bins)
+    for k in range(n_bins):
+        acc = 0.0
+        for t in range(n_frames):
+            acc += abs_stft_x[k, t]
+        a[k] = acc / n_frames
+    for j in range(n_onsets):
+        acc = 0.0
+        for k in range(n_bins):
+            b = spectral_profiles[j, k]
+            if a[k] == 0.0 or b == 0.0:
+                # The NumPy version evaluates to inf - inf here
+                acc += np.nan
+            else:
+                # log(a/b) + log(b/a) cancels, so the logs need not be evaluated
+                acc += a[k] / b + b / a[k] - 2
+        out[j] = acc / n_bins
+
+if NUMBA_AVAILABLE:
+    _cosh_distance_multi_kernel = numba.njit(cache=True, error_model="numpy")(_cosh_distance_multi_kernel)
+
+def cosh_distance_multi_jit(abs_stft_x:np.ndarray, spectral_profiles:np.ndarray, n_frames:int=None) -> np.ndarray:
+    """Calculates the cosh-distance between one magnitude spectrum x
+    and many time-averaged magnitude spectra in one compiled pass.
+    Equivalent to fitness.cosh_distance_multi. Without numba the kernel runs as plain
+    (slow) python, so callers should check NUMBA_AVAILABLE and use the NumPy version otherwise.
+
+    Parameters
+    ----------
+    abs_stft_x : np.ndarray[float]
+        Absolute stft values (magnitude spectrum) for x, of shape (n_bins, n_frames)
+    spectral_profiles : np.ndarray[float]
+        Time-averaged magnitude spectra of shape (n_onsets, n_bins), see Target.spectral_profiles
+    n_frames : int, optional
+        Number of leading frames of abs_stft_x to average over. All frames if None.
+
+    Returns
+    -------
+    np.ndarray
+        Cosh distance between x and each of the profiles.
+    """
+    if n_frames is None:
+        n_frames = abs_stft_x.shape[1]
+    out = np.empty(spectral_profiles.shape[0])
+    _cosh_distance_multi_kernel(abs_stft_x, spectral_profiles, n_frames, out)
+    return out
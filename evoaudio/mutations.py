@@ -11,6 +11,7 @@ BETA = 3
 L_BOUND = 1
 U_BOUND = 10
 PITCH_SHIFT_STD = 15
+N_NEIGHBORS = 10 # Number of spectrally nearest samples that mutate_spectral_neighbor chooses from
 
 class Mutator:
     def __init__(self, 
@@ -19,7 +20,8 @@ class Mutator:
                  l_bound:int=L_BOUND, u_bound:int=U_BOUND, 
                  sample_number_increase_p:list[float]=SAMPLE_NUMBER_INCREASE_P, 
                  pitch_shift_std:float=PITCH_SHIFT_STD, 
-                 choose_mutation_p:list[float]=CHOOSE_MUTATION_P):
+                 choose_mutation_p:list[float]=CHOOSE_MUTATION_P,
+                 n_neighbors:int=N_NEIGHBORS):
         """Creates an instance of the Mutator class.
 
         Parameters
@@ -40,8 +42,14 @@ class Mutator:
         pitch_shift_std : float, optional
             Standard deviation of a pitch shift mutation. by default PITCH_SHIFT_STD
         choose_mutation_p : list[float], optional
-            Probabilities of each mutation to be applied, by default CHOOSE_MUTATION_P
+            Probabilities of each mutation to be applied, by default CHOOSE_MUTATION_P.
+            In order: mutate_n_samples, mutate_instrument, mutate_pitch and, optionally, mutate_spectral_neighbor.
+        n_neighbors : int, optional
+            Number of spectrally nearest samples that mutate_spectral_neighbor chooses from, by default N_NEIGHBORS.
+            Only used to build the library's spectral index if it does not exist yet.
         """
+        if len(choose_mutation_p) == 4 and choose_mutation_p[3] > 0 and not sample_library.has_spectral_index():
+            sample_library.build_spectral_index(k=n_neighbors)
         self.sample_library = sample_library
         self.alpha = alpha
         self.beta = beta
@@ -50,6 +58,7 @@ class Mutator:
         self.sample_number_increase_p = sample_number_increase_p
         self.pitch_shift_std = pitch_shift_std
         self.choose_mutation_p = choose_mutation_p
+        self.n_neighbors = n_neighbors
 
     def mutate_individual(self, individual:BaseIndividual) -> BaseIndividual:
         """Mutates an individual with one or more of the available mutation operations.
@@ -71,7 +80,8 @@ class Mutator:
 
         for _ in range(n_mutations):
             # Decide which mutation to apply
-            mutation = np.random.choice([self.mutate_n_samples, self.mutate_instrument, self.mutate_pitch], p=self.choose_mutation_p)
+            mutations = [self.mutate_n_samples, self.mutate_instrument, self.mutate_pitch, self.mutate_spectral_neighbor]
+            mutation = np.random.choice(mutations[:len(self.choose_mutation_p)], p=self.choose_mutation_p)
             # Apply mutation
             mutated_individual = mutation(individual)
             # Set recalc fitness flag
@@ -93,18 +103,18 @@ class Mutator:
         BaseIndividual
             The individual after the number of samples was changed.
         """
-        pre_mutation_n_samples = len(individual.samples)
+        pre_mutation_n_samples = individual.get_n_samples()
         increase_probability = self.sample_number_increase_p[pre_mutation_n_samples - 1]
         # Increase or decrease number of samples
         rnd = np.random.random()
         if rnd < increase_probability:
             # Add a sample
             new_sample = self.sample_library.get_random_sample_uniform()
-            individual.samples.append(new_sample)
+            individual.append_sample(new_sample)
         else:
             # Remove a sample
             idx = np.random.choice(pre_mutation_n_samples)
-            individual.samples.pop(idx)
+            individual.remove_sample(idx)
         return individual
 
     def mutate_instrument(self, individual:BaseIndividual) -> BaseIndividual:
@@ -125,11 +135,11 @@ class Mutator:
         RuntimeError
             If no new sample could be found for some reason.
         """
-        pre_mutation_n_samples = len(individual.samples)
+        pre_mutation_n_samples = individual.get_n_samples()
 
         # Choose one instrument
         change_idx = np.random.choice(pre_mutation_n_samples)
-        pitch = individual.samples[change_idx].pitch
+        pitch = individual.get_sample(change_idx).pitch
 
         # Randomly change instrument and style uniformly
         new_instrument, new_style = self.sample_library.get_random_instrument_for_pitch(pitch)
@@ -138,7 +148,7 @@ class Mutator:
         # See if old pitch exists for new instrument
         new_sample = self.sample_library.get_sample(new_instrument, new_style, pitch)
         if new_sample:
-            individual.samples[change_idx] = new_sample
+            individual.replace_sample(change_idx, new_sample)
         else:
             # Something went wrong
             raise RuntimeError("A sample for the requested instrument, style and pitch does not exist.")
@@ -158,20 +168,50 @@ class Mutator:
         BaseIndividual
             The individual after one of its samples' pitch was changed.
         """
-        pre_mutation_n_samples = len(individual.samples)
+        pre_mutation_n_samples = individual.get_n_samples()
 
         # Choose one instrument
         change_idx = np.random.choice(pre_mutation_n_samples)
-        chosen_sample = individual.samples[change_idx]
+        chosen_sample = individual.get_sample(change_idx)
         
         # Choose a new pitch
         #new_pitch = self.sample_library.get_random_pitch_for_instrument_uniform(chosen_sample.instrument, chosen_sample.style)
         shift_by = np.floor(np.random.normal(loc=0, scale=self.pitch_shift_std))
         new_pitch = self.sample_library.get_shifted_pitch(chosen_sample.instrument, chosen_sample.style, chosen_sample.pitch, shift_by)
-        individual.samples[change_idx] = self.sample_library.get_sample(chosen_sample.instrument, chosen_sample.style, new_pitch)
+        individual.replace_sample(change_idx, self.sample_library.get_sample(chosen_sample.instrument, chosen_sample.style, new_pitch))
 
         return individual
     
+    def mutate_spectral_neighbor(self, individual:BaseIndividual) -> BaseIndividual:
+        """Replaces one of the samples in the given individual by one of 
+        its spectrally nearest samples (see SampleLibrary.build_spectral_index),
+        which may differ in instrument, style and pitch.
+        Falls back to mutate_pitch if the individual's samples carry no library ids,
+        e.g. samples that were created outside of the library.
+
+        Parameters
+        ----------
+        individual : BaseIndividual
+            Individual that shall be mutated.
+
+        Returns
+        -------
+        BaseIndividual
+            The individual after one of its samples was replaced.
+        """
+        if not individual.has_sample_ids():
+            return self.mutate_pitch(individual)
+        pre_mutation_n_samples = individual.get_n_samples()
+
+        # Choose one sample
+        change_idx = np.random.choice(pre_mutation_n_samples)
+        neighbors = self.sample_library.get_spectral_neighbors(individual.get_sample(change_idx).id)
+        if len(neighbors) > 0:
+            new_sample = self.sample_library.get_sample_by_id(int(neighbors[np.random.randint(len(neighbors))]))
+            individual.replace_sample(change_idx, new_sample)
+
+        return individual
+
     def step_size_control(self, zeta:float):
         """
         Decrease std, mean and upper bound of the number of mutations applied 
@@ -1,5 +1,6 @@
 from __future__ import annotations
-import bisect
+from collections.abc import MutableMapping
+import heapq
 import pickle
 from typing import Union
 
@@ -7,18 +8,114 @@ import numpy as np
 
 from .individual import BaseIndividual
 from .base_sample import BaseSample, FlatSample
+from .slots import SlotsPickleMixin
 
 class Population:
     individuals: list[BaseIndividual]
-    archive: dict[int, ArchiveRecord]
+    archive: Archive
     
     def __init__(self) -> None:
         self.individuals = [] # List of BaseIndividuals, Sorted by fitness values
-        self.archive = {} # Dict of onset: SampleCollection # TODO: Refactor and expand archive to hold records for each instrument
+        self.archive = Archive() # Best individual per onset # TODO: Refactor and expand archive to hold records for each instrument
+        self._init_arrays()
     
     def __str__(self) -> str:
         return "\n".join([str(individual) for individual in self.individuals])
 
+    def _init_arrays(self) -> None:
+        # Buffers with spare capacity, so that insertions shift values in place instead of reallocating
+        self._size = 0 # Number of individuals the buffers hold
+        self._fitness_buffer = np.empty(0) # Fitness of each individual, in the order of self.individuals
+        self._slot_buffer = np.empty(0, dtype=np.int64) # Row of self._onset_fitness of each individual, in the order of self.individuals
+        self._onset_fitness = np.empty((0, 0)) # Per-onset fitness of each individual, one row (slot) per individual
+        self._free_slots = [] # Rows of self._onset_fitness that are not in use
+        self._arrays_dirty = True # True if the buffers have to be rebuilt from self.individuals before their next use
+
+    def __getstate__(self):
+        # The arrays mirror the individuals and the archive, so they are rebuilt instead of being pickled
+        state = self.__dict__.copy()
+        for key in ("_size", "_fitness_buffer", "_slot_buffer", "_onset_fitness", "_free_slots", "_arrays_dirty"):
+            state.pop(key, None)
+        state["individuals"] = state.pop("_individuals") # Same key as before individuals became a property
+        return state
+
+    def __setstate__(self, state):
+        state = dict(state)
+        state["_individuals"] = state.pop("individuals")
+        self.__dict__.update(state)
+        self._init_arrays() # Also initializes populations pickled before the arrays existed
+        self._rebuild_arrays()
+        if isinstance(self.archive, dict):
+            # Populations pickled before the archive was array-based
+            self.archive = Archive.from_records(self.archive.values())
+
+    @property
+    def individuals(self) -> list[BaseIndividual]:
+        """List of individuals, sorted by fitness.
+        Assigning a new list, or adding or removing individuals in place, makes the fitness arrays rebuild 
+        on their next use. After replacing individuals in place or changing their fitness, call invalidate_arrays.
+        """
+        return self._individuals
+
+    @individuals.setter
+    def individuals(self, individuals:list[BaseIndividual]) -> None:
+        self._individuals = individuals
+        self._arrays_dirty = True
+
+    def invalidate_arrays(self) -> None:
+        """Marks the fitness arrays for a rebuild, e.g. after self.individuals was modified in place.
+        """
+        self._arrays_dirty = True
+
+    @property
+    def fitness_values(self) -> np.ndarray:
+        """Fitness of all individuals, in the order of self.individuals.
+        """
+        self._ensure_arrays()
+        return self._fitness_buffer[:self._size]
+
+    def _rebuild_arrays(self) -> None:
+        """Rebuilds the fitness arrays from self.individuals, e.g. after the list was modified directly.
+        Rows of individuals with fewer per-onset fitness values than others are padded with nan.
+        """
+        self._arrays_dirty = False
+        self._size = len(self.individuals)
+        self._fitness_buffer = np.array([individual.fitness for individual in self.individuals], dtype=np.float64)
+        self._onset_fitness = _stack_onset_fitness(self.individuals)
+        self._slot_buffer = np.arange(self._size, dtype=np.int64)
+        self._free_slots = []
+
+    def _ensure_arrays(self) -> None:
+        # The length check catches individuals appended to or deleted from the list directly
+        if self._arrays_dirty or self._size != len(self._individuals):
+            self._rebuild_arrays()
+
+    def _reserve(self, n_onsets:int) -> None:
+        """Makes room for one more individual with n_onsets per-onset fitness values.
+        """
+        n_missing = n_onsets - self._onset_fitness.shape[1]
+        if n_missing > 0:
+            # More onsets than the stored individuals, e.g. after merging populations
+            self._onset_fitness = np.pad(self._onset_fitness, ((0, 0), (0, n_missing)), constant_values=np.nan)
+        capacity = len(self._fitness_buffer)
+        if self._size < capacity:
+            return
+        # Double the capacity
+        new_capacity = max(1, 2 * capacity)
+        self._fitness_buffer = np.concatenate([self._fitness_buffer, np.empty(new_capacity - capacity)])
+        self._slot_buffer = np.concatenate([self._slot_buffer, np.empty(new_capacity - capacity, dtype=np.int64)])
+        n_rows = len(self._onset_fitness)
+        if n_rows < new_capacity:
+            self._onset_fitness = np.concatenate([self._onset_fitness, np.full((new_capacity - n_rows, self._onset_fitness.shape[1]), np.nan)])
+            self._free_slots.extend(range(new_capacity - 1, n_rows - 1, -1))
+
+    @property
+    def onset_fitness_matrix(self) -> np.ndarray:
+        """Per-onset fitness of all individuals as a matrix of shape (n_individuals, n_onsets), in the order of self.individuals.
+        """
+        self._ensure_arrays()
+        return self._onset_fitness[self._slot_buffer[:self._size]]
+
     def init_archive(self, onsets:Union[list[int], np.ndarray[int]]) -> None:
         """Initializes the archive of best individuals per onset.
 
@@ -27,15 +124,19 @@ class Population:
         onsets : list[int]
             list of onsets from the target piece
         """
-        for individual in self.individuals:
-            for i, onset in enumerate(onsets):
-                if individual.fitness_per_onset[i] < self.archive.get(onset, BaseIndividual()).fitness:
-                    self.archive[onset] = ArchiveRecord(onset=onset, fitness=individual.fitness_per_onset[i], individual=individual)
+        individuals = self.get_individuals_unsorted() # In the order of the rows of onset_fitness_matrix
+        if len(individuals) > 0:
+            onset_fitness = self.onset_fitness_matrix[:, :len(onsets)]
+            onset_fitness = np.where(np.isnan(onset_fitness), np.inf, onset_fitness) # nan never improves a record
+            best_rows = np.argmin(onset_fitness, axis=0) # First best individual per onset
+            best_fitness = onset_fitness[best_rows, np.arange(len(best_rows))]
+            self.archive.improve_onsets(onsets[:len(best_rows)], best_fitness, [individuals[row] for row in best_rows])
 
     def sort_individuals_by_fitness(self):
         """Sorts the list of individuals by fitness. Meant to only be done upon initialization. 
         """
         self.individuals.sort(key=lambda item: item.fitness)
+        self._rebuild_arrays()
 
     def insert_individual(self, individual:BaseIndividual):
         """Inserts an individual into the population. 
@@ -46,13 +147,24 @@ class Population:
         individual : BaseIndividual
             An individual containing one or more samples and calculated fitness value.
         """
-        # Insert individual
-        bisect.insort_left(self.individuals, individual, key=lambda item: item.fitness)
+        self._ensure_arrays()
+        fitness_per_onset = np.asarray(individual.fitness_per_onset, dtype=np.float64)
+        self._reserve(len(fitness_per_onset))
+        # Insert individual before any individual of equal fitness
+        n = self._size
+        idx = int(np.searchsorted(self._fitness_buffer[:n], individual.fitness, side="left"))
+        self.individuals.insert(idx, individual)
+        self._fitness_buffer[idx+1:n+1] = self._fitness_buffer[idx:n]
+        self._fitness_buffer[idx] = individual.fitness
+        slot = self._free_slots.pop()
+        if len(fitness_per_onset) < self._onset_fitness.shape[1]:
+            self._onset_fitness[slot] = np.nan
+        self._onset_fitness[slot, :len(fitness_per_onset)] = fitness_per_onset
+        self._slot_buffer[idx+1:n+1] = self._slot_buffer[idx:n]
+        self._slot_buffer[idx] = slot
+        self._size = n + 1
         # Update record of best onset approximations
-        for i, onset in enumerate(self.archive):
-            if individual.fitness_per_onset[i] < self.archive[onset].fitness:
-                self.archive[onset].individual = individual
-                self.archive[onset].fitness = individual.fitness_per_onset[i]
+        self.archive.improve(fitness_per_onset, individual)
 
     def remove_worst(self, n:int):
         """Removes the worst n individuals from the population.
@@ -63,7 +175,13 @@ class Population:
         n : int
             Number of individuals to remove from the population.
         """
-        self.individuals = self.individuals[:-n]
+        if n <= 0:
+            return
+        self._ensure_arrays()
+        n = min(n, self._size)
+        self._free_slots.extend(self._slot_buffer[self._size-n:self._size].tolist())
+        del self.individuals[-n:]
+        self._size -= n
 
     def get_best_individual(self) -> BaseIndividual:
         """Returns the individual with highest fitness.
@@ -74,6 +192,28 @@ class Population:
             Individual with the highest fitness
         """
         return self.individuals[0]
+
+    def get_individuals_unsorted(self) -> list[BaseIndividual]:
+        """Returns the individuals in the order in which the population stores them, 
+        in the order of fitness_values and onset_fitness_matrix. 
+        Unlike self.individuals, this never sorts. The list must not be modified.
+        """
+        return self.individuals
+
+    def choose_parents(self, n:int) -> list[BaseIndividual]:
+        """Draws n parents uniformly at random, with replacement.
+
+        Parameters
+        ----------
+        n : int
+            Number of parents.
+
+        Returns
+        -------
+        list[BaseIndividual]
+            The parents.
+        """
+        return np.random.choice(self.individuals, size=n)
     
     def merge_populations(self, other_pop:Population):
         """Merges this population with another, taking into account mismatches in the approximated onsets.
@@ -101,22 +241,27 @@ class Population:
                 self.archive[onset] = record
                 onset_mismatch = True
         # Merge individual list
-        for individual in other_pop.individuals:
+        other_individuals = other_pop.get_individuals_unsorted()
+        for individual in other_individuals:
             individual.recalc_fitness = True
-        self.individuals += other_pop.individuals
+        self._extend(other_individuals)
 
         return not onset_mismatch
+
+    def _extend(self, individuals:list[BaseIndividual]) -> None:
+        # Appends individuals without keeping the fitness order
+        self.individuals += individuals
+        self._rebuild_arrays()
     
     def _flatten(self):
         """Flattens the population to reduce disk space usage.
         """
         for individual in self.individuals:
-            for i, sample in enumerate(individual.samples):
-                individual.samples[i] = FlatSample(sample.instrument, sample.style, sample.pitch)
-        for record in self.archive.values():
-            individual = record.individual
-            for i, sample in enumerate(individual.samples):
-                individual.samples[i] = FlatSample(sample.instrument, sample.style, sample.pitch)
+            individual.samples = [FlatSample(sample.instrument, sample.style, sample.pitch) for sample in individual.iter_samples()]
+            individual.stft = None
+        for individual in self.archive.get_unique_individuals():
+            individual.samples = [FlatSample(sample.instrument, sample.style, sample.pitch) for sample in individual.iter_samples()]
+            individual.stft = None
 
     def _expand(self, sample_lib):
         """Expands a flattened population by reloading the included samples from the sample library.
@@ -127,12 +272,9 @@ class Population:
             Initialized sample library from which to load the samples in this population.
         """
         for individual in self.individuals:
-            for i, sample in enumerate(individual.samples):
-                individual.samples[i] = sample_lib.get_sample(sample.instrument, sample.style, sample.pitch)
-        for record in self.archive.values():
-            individual = record.individual
-            for i, sample in enumerate(individual.samples):
-                individual.samples[i] = sample_lib.get_sample(sample.instrument, sample.style, sample.pitch)
+            individual.samples = [sample_lib.get_sample(sample.instrument, sample.style, sample.pitch) for sample in individual.iter_samples()]
+        for individual in self.archive.get_unique_individuals():
+            individual.samples = [sample_lib.get_sample(sample.instrument, sample.style, sample.pitch) for sample in individual.iter_samples()]
 
     def save_as_file(self, filename:str, flatten:bool=True):
         """Saves the population to a pickled file.
@@ -174,8 +316,382 @@ class Population:
             
             return obj
 
-class ArchiveRecord():
+class SteadyStatePopulation(Population):
+    """Population for steady-state replacement with O(log n) insertion and removal of the worst individual.
+    The individuals are kept in an unordered list, next to a max-heap of their fitness for removing the worst
+    and a min-heap for finding the best. Entries of removed individuals are dropped from the min-heap lazily.
+    self.individuals still returns the individuals sorted by fitness, but builds that list on every access,
+    so the evolutionary loop and the loggers use choose_parents, get_best_individual, fitness_values 
+    and get_individuals_unsorted instead.
+    Ties are broken like in Population: among individuals of equal fitness, the newest one counts as the best.
+    """
+    def _init_arrays(self) -> None:
+        self._members = [] # Individuals in the order they were added, until remove_worst fills gaps with the last member
+        self._member_ids = [] # Insertion number of each individual in self._members
+        self._positions = {} # Dict of insertion number: index in self._members
+        self._worst_heap = [] # Max-heap of (-fitness, insertion number, individual)
+        self._best_heap = [] # Min-heap of (fitness, -insertion number, individual), may contain removed individuals
+        self._n_inserted = 0
+
+    def __getstate__(self):
+        return {"individuals": self.individuals, "archive": self.archive}
+
+    def __setstate__(self, state):
+        self.archive = state["archive"]
+        self._init_arrays()
+        self.individuals = state["individuals"]
+
+    @property
+    def individuals(self) -> list[BaseIndividual]:
+        return [entry[2] for entry in sorted(self._worst_heap, key=lambda entry: entry[:2], reverse=True)]
+
+    @individuals.setter
+    def individuals(self, individuals:list[BaseIndividual]) -> None:
+        self._init_arrays()
+        self._members = list(individuals)
+        # Descending insertion numbers, so that ties keep the order of the list, like the stable sort of Population
+        self._member_ids = list(range(len(individuals) - 1, -1, -1))
+        self._positions = {member_id: position for position, member_id in enumerate(self._member_ids)}
+        self._n_inserted = len(individuals)
+        self._rebuild_arrays()
+
+    @property
+    def fitness_values(self) -> np.ndarray:
+        """Fitness of all individuals, in the order of get_individuals_unsorted.
+        """
+        return np.array([individual.fitness for individual in self._members], dtype=np.float64)
+
+    @property
+    def onset_fitness_matrix(self) -> np.ndarray:
+        """Per-onset fitness of all individuals as a matrix of shape (n_individuals, n_onsets), in the order of get_individuals_unsorted.
+        """
+        return _stack_onset_fitness(self._members)
+
+    def get_individuals_unsorted(self) -> list[BaseIndividual]:
+        """Returns the individuals in the order in which the population stores them, without sorting. 
+        The list must not be modified.
+        """
+        return self._members
+
+    def _extend(self, individuals:list[BaseIndividual]) -> None:
+        for individual in individuals:
+            self._add(individual)
+        self._rebuild_arrays()
+
+    @staticmethod
+    def _heap_key(individual:BaseIndividual) -> float:
+        return np.inf if np.isnan(individual.fitness) else individual.fitness
+
+    def _add(self, individual:BaseIndividual) -> int:
+        # Adds an individual to the list of members, without updating the heaps
+        member_id = self._n_inserted
+        self._n_inserted += 1
+        self._positions[member_id] = len(self._members)
+        self._members.append(individual)
+        self._member_ids.append(member_id)
+        return member_id
+
+    def _rebuild_arrays(self) -> None:
+        """Rebuilds both heaps from the current fitness of the members, e.g. after their fitness was (re)calculated.
+        """
+        self._worst_heap = [(-self._heap_key(individual), member_id, individual) for individual, member_id in zip(self._members, self._member_ids)]
+        self._best_heap = [(-key, -member_id, individual) for key, member_id, individual in self._worst_heap]
+        heapq.heapify(self._worst_heap)
+        heapq.heapify(self._best_heap)
+
+    def _ensure_arrays(self) -> None:
+        pass
+
+    def invalidate_arrays(self) -> None:
+        """Rebuilds the heaps right away, e.g. after the fitness of the individuals was changed.
+        self.individuals is a new list on every access, so modifying it in place has no effect.
+        """
+        self._rebuild_arrays()
+
+    def sort_individuals_by_fitness(self):
+        """Rebuilds the heaps. Needs to be called once the fitness of the initial individuals is known.
+        """
+        self._rebuild_arrays()
+
+    def insert_individual(self, individual:BaseIndividual):
+        """Inserts an individual into the population in O(log n).
+
+        Parameters
+        ----------
+        individual : BaseIndividual
+            An individual containing one or more samples and calculated fitness value.
+        """
+        member_id = self._add(individual)
+        key = self._heap_key(individual)
+        heapq.heappush(self._worst_heap, (-key, member_id, individual))
+        heapq.heappush(self._best_heap, (key, -member_id, individual))
+        # Update record of best onset approximations
+        self.archive.improve(np.asarray(individual.fitness_per_onset, dtype=np.float64), individual)
+
+    def remove_worst(self, n:int):
+        """Removes the worst n individuals from the population in O(n log n).
+
+        Parameters
+        ----------
+        n : int
+            Number of individuals to remove from the population.
+        """
+        for _ in range(min(n, len(self._worst_heap))):
+            _, member_id, _ = heapq.heappop(self._worst_heap)
+            # Fill the gap in the member list with the last member
+            position = self._positions.pop(member_id)
+            last_individual, last_id = self._members.pop(), self._member_ids.pop()
+            if last_id != member_id:
+                self._members[position] = last_individual
+                self._member_ids[position] = last_id
+                self._positions[last_id] = position
+        if len(self._best_heap) > 2 * len(self._worst_heap) + 64:
+            # Drop the entries of removed individuals
+            self._best_heap = [entry for entry in self._best_heap if -entry[1] in self._positions]
+            heapq.heapify(self._best_heap)
+
+    def get_best_individual(self) -> BaseIndividual:
+        """Returns the individual with highest fitness.
+
+        Returns
+        -------
+        BaseIndividual
+            Individual with the highest fitness
+        """
+        while -self._best_heap[0][1] not in self._positions:
+            heapq.heappop(self._best_heap)
+        return self._best_heap[0][2]
+
+    def choose_parents(self, n:int) -> list[BaseIndividual]:
+        """Draws n parents uniformly at random, with replacement, without sorting the population.
+
+        Parameters
+        ----------
+        n : int
+            Number of parents.
+
+        Returns
+        -------
+        list[BaseIndividual]
+            The parents.
+        """
+        return [self._members[i] for i in np.random.randint(0, len(self._members), size=n)]
+
+def _stack_onset_fitness(individuals:list[BaseIndividual]) -> np.ndarray:
+    """Stacks the per-onset fitness of individuals into a matrix of shape (n_individuals, n_onsets).
+    Rows of individuals with fewer per-onset fitness values than others are padded with nan.
+    """
+    n_onsets = max((len(individual.fitness_per_onset) for individual in individuals), default=0)
+    onset_fitness = np.full((len(individuals), n_onsets), np.nan)
+    for row, individual in enumerate(individuals):
+        onset_fitness[row, :len(individual.fitness_per_onset)] = individual.fitness_per_onset
+    return onset_fitness
+
+class ArchiveRecord(SlotsPickleMixin):
+    __slots__ = ("onset", "fitness", "individual")
+
     def __init__(self, onset:int, fitness:float=None, individual:BaseIndividual=None) -> None:
         self.onset = onset
         self.fitness = fitness
-        self.individual = individual
\ No newline at end of file
+        self.individual = individual
+
+class LiveArchiveRecord(ArchiveRecord):
+    """Record returned by Archive.__getitem__. Its fitness and individual are read from and written to the archive,
+    so record.fitness = x changes the archive like it did for the records of the former dict.
+    The onset can not be changed. Pickles as a plain ArchiveRecord with the current values.
+    """
+    __slots__ = ("_archive",)
+
+    def __init__(self, archive:Archive, onset:int) -> None:
+        object.__setattr__(self, "_archive", archive)
+        object.__setattr__(self, "onset", onset)
+
+    def __setattr__(self, name, value) -> None:
+        if name not in ("fitness", "individual"):
+            raise AttributeError(f"Only fitness and individual of an archive record can be changed, not {name}.")
+        super().__setattr__(name, value)
+
+    def __reduce__(self):
+        return ArchiveRecord, (self.onset, self.fitness, self.individual)
+
+    @property
+    def fitness(self) -> float:
+        return self._archive.fitness[self._archive._positions[self.onset]]
+
+    @fitness.setter
+    def fitness(self, fitness:float) -> None:
+        self._archive.fitness[self._archive._positions[self.onset]] = np.nan if fitness is None else fitness
+
+    @property
+    def individual(self) -> BaseIndividual:
+        return self._archive.individuals[self._archive.best_index[self._archive._positions[self.onset]]]
+
+    @individual.setter
+    def individual(self, individual:BaseIndividual) -> None:
+        self._archive._maybe_compact()
+        self._archive.best_index[self._archive._positions[self.onset]] = self._archive._store(individual)
+
+class Archive(MutableMapping):
+    """Record of the best individual found for each onset.
+    Stored as arrays in column order, i.e. entry i belongs to fitness_per_onset[i] of the individuals:
+    the onsets, the best fitness per onset and for each onset the index of its best individual in self.individuals.
+    Behaves like the former dict of onset: ArchiveRecord. Records returned by it are LiveArchiveRecords,
+    which read from and write to the archive.
+    """
+    def __init__(self) -> None:
+        self.onsets = np.empty(0, dtype=np.int64) # Onsets in column order
+        self.fitness = np.empty(0) # Best fitness per onset
+        self.best_index = np.empty(0, dtype=np.int64) # Index of the best individual per onset in self.individuals
+        self.individuals = [] # Individuals referenced by self.best_index. May contain individuals that are no longer referenced
+        self._positions = {} # Dict of onset: column
+        self._sort_order = None # Columns sorted by onset, for range queries
+
+    @classmethod
+    def from_records(cls, records) -> Archive:
+        """Creates an archive from ArchiveRecords, in the order given.
+        """
+        archive = cls()
+        for record in records:
+            archive[record.onset] = record
+        return archive
+
+    def __getstate__(self):
+        self.compact()
+        state = self.__dict__.copy()
+        state["_sort_order"] = None
+        return state
+
+    def __len__(self) -> int:
+        return len(self.onsets)
+
+    def __iter__(self):
+        return iter(self.onsets.tolist())
+
+    def __contains__(self, onset) -> bool:
+        return onset in self._positions
+
+    def __getitem__(self, onset) -> LiveArchiveRecord:
+        if onset not in self._positions:
+            raise KeyError(onset)
+        return LiveArchiveRecord(archive=self, onset=onset)
+
+    def __setitem__(self, onset, record:ArchiveRecord) -> None:
+        fitness = np.nan if record.fitness is None else record.fitness
+        self._maybe_compact()
+        if onset in self._positions:
+            column = self._positions[onset]
+            self.fitness[column] = fitness
+            self.best_index[column] = self._store(record.individual)
+        else:
+            self._append([onset], [fitness], [self._store(record.individual)])
+
+    def __delitem__(self, onset) -> None:
+        column = self._positions[onset]
+        self.onsets = np.delete(self.onsets, column)
+        self.fitness = np.delete(self.fitness, column)
+        self.best_index = np.delete(self.best_index, column)
+        self._positions = {onset: column for column, onset in enumerate(self.onsets.tolist())}
+        self._sort_order = None
+
+    def _append(self, onsets:list, fitness:list, best_index:list) -> None:
+        for column, onset in enumerate(onsets, start=len(self.onsets)):
+            self._positions[onset] = column
+        self.onsets = np.append(self.onsets, np.asarray(onsets, dtype=np.int64))
+        self.fitness = np.append(self.fitness, np.asarray(fitness, dtype=np.float64))
+        self.best_index = np.append(self.best_index, np.asarray(best_index, dtype=np.int64))
+        self._sort_order = None
+
+    def _store(self, individual:BaseIndividual) -> int:
+        """Adds an individual to self.individuals and returns its index.
+        """
+        if len(self.individuals) > 0 and self.individuals[-1] is individual:
+            return len(self.individuals) - 1
+        self.individuals.append(individual)
+        return len(self.individuals) - 1
+
+    def _maybe_compact(self) -> None:
+        if len(self.individuals) > 2 * len(self.onsets) + 64:
+            self.compact()
+
+    def compact(self) -> None:
+        """Drops individuals that are no longer the best of any onset.
+        """
+        used, self.best_index = np.unique(self.best_index, return_inverse=True)
+        self.best_index = self.best_index.astype(np.int64)
+        self.individuals = [self.individuals[i] for i in used]
+
+    def improve(self, fitness_per_onset:np.ndarray, individual:BaseIndividual) -> np.ndarray:
+        """Makes the individual the best of all onsets on which it is better than the current best.
+
+        Parameters
+        ----------
+        fitness_per_onset : np.ndarray
+            Fitness of the individual per onset, in column order.
+        individual : BaseIndividual
+            The individual.
+
+        Returns
+        -------
+        np.ndarray
+            Columns of the improved onsets.
+        """
+        n_onsets = min(len(self.fitness), len(fitness_per_onset))
+        improved = np.flatnonzero(fitness_per_onset[:n_onsets] < self.fitness[:n_onsets])
+        if len(improved) > 0:
+            self._maybe_compact()
+            self.best_index[improved] = self._store(individual)
+            self.fitness[improved] = fitness_per_onset[improved]
+        return improved
+
+    def improve_onsets(self, onsets:Union[list[int], np.ndarray[int]], fitness:np.ndarray, individuals:list[BaseIndividual]) -> None:
+        """Records one individual per onset, where it is better than the current best or the onset has no record yet.
+
+        Parameters
+        ----------
+        onsets : Union[list[int], np.ndarray[int]]
+            Onsets. New onsets are appended in the order given.
+        fitness : np.ndarray
+            Fitness of the individuals on their onsets.
+        individuals : list[BaseIndividual]
+            Individual per onset.
+        """
+        self._maybe_compact()
+        new_onsets, new_fitness, new_index = [], [], []
+        for onset, onset_fitness, individual in zip(onsets, fitness, individuals):
+            column = self._positions.get(onset)
+            if column is None:
+                if onset_fitness < np.inf:
+                    new_onsets.append(onset)
+                    new_fitness.append(onset_fitness)
+                    new_index.append(self._store(individual))
+            elif onset_fitness < self.fitness[column]:
+                self.fitness[column] = onset_fitness
+                self.best_index[column] = self._store(individual)
+        if len(new_onsets) > 0:
+            self._append(new_onsets, new_fitness, new_index)
+
+    def get_best_individuals(self) -> list[BaseIndividual]:
+        """Returns the best individual of each onset, in column order.
+        """
+        return [self.individuals[index] for index in self.best_index]
+
+    def get_unique_individuals(self) -> list[BaseIndividual]:
+        """Returns every individual that is the best of at least one onset, once.
+        """
+        self.compact()
+        return list(self.individuals)
+
+    def get_columns_in_range(self, start:int, end:int) -> np.ndarray:
+        """Returns the columns of all onsets with start <= onset < end, sorted by onset.
+        """
+        if self._sort_order is None:
+            self._sort_order = np.argsort(self.onsets, kind="stable")
+        sorted_onsets = self.onsets[self._sort_order]
+        first, last = np.searchsorted(sorted_onsets, [start, end], side="left")
+        return self._sort_order[first:last]
+
+    def get_individuals_in_range(self, start:int, end:int) -> list[BaseIndividual]:
+        """Returns the best individual of every onset with start <= onset < end, sorted by onset.
+        An individual that is the best of several of these onsets is returned once per onset.
+        """
+        return [self.individuals[index] for index in self.best_index[self.get_columns_in_range(start, end)]]
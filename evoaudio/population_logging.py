@@ -16,8 +16,8 @@ class PopulationLogger:
     
     def log_population(self, pop:Population, step:int) -> None:
         self.logged_steps.append(step)
-        self.mean_fitness.append(np.mean([individual.fitness for individual in pop.individuals]))
-        self.mean_fitness_best_records.append(np.mean([record.fitness for i, record in enumerate(pop.archive.values())]))
+        self.mean_fitness.append(np.mean(pop.fitness_values))
+        self.mean_fitness_best_records.append(np.mean(pop.archive.fitness))
         self.elitist_fitness.append(pop.get_best_individual().fitness)
 
     def plot_log(self):
@@ -40,7 +40,7 @@ class CombinedLogger():
         self.logged_errors.append((j_i, j_p, j_ip))
 
     def log_fitness(self, pop):
-        self.logged_fitnesses.append(np.mean([record.fitness for record in pop.archive.values()]))
+        self.logged_fitnesses.append(np.mean(pop.archive.fitness))
         
     def log_population(self, pop, step):
         if step % self.logging_interval == 0:
@@ -1,31 +1,406 @@
+from collections import OrderedDict
+from functools import partial
 from glob import glob
+import hashlib
+import json
+from multiprocessing.shared_memory import SharedMemory
+import os
+import time
 from typing import Union, Tuple
 
 import librosa
 import numpy as np
 from tqdm import tqdm
-from tqdm.contrib.concurrent import thread_map
+from tqdm.contrib.concurrent import process_map, thread_map
 
-from .base_sample import BaseSample
+from .base_sample import BaseSample, FlatSample
 from .instrument_info import InstrumentInfo
 from .pitch import Pitch, DrumHit
+from .stft import N_FFT, n_frames, snippet_stft
+
+COMPILED_FORMAT_VERSION = 2 # Bump when the layout of compiled libraries changes, invalidates existing caches
+COMPILED_AUDIO_FILE = "samples.npy"
+COMPILED_INDEX_FILE = "index.json"
+
+def decode_sample_file(path:str, dtype=np.float32, max_length:int=None) -> BaseSample:
+    """Decodes a single sample file. Module-level, so that it can be sent to worker processes.
+
+    Parameters
+    ----------
+    path : str
+        Path to the sample file.
+    dtype : np.dtype, optional
+        Precision of the decoded audio, by default np.float32
+    max_length : int, optional
+        If given, only the first max_length samples of the audio are kept.
+
+    Returns
+    -------
+    BaseSample
+        Sample with instrument, style and pitch parsed from path.
+    """
+    y, sr = librosa.load(path, dtype=dtype)
+    if max_length is not None and len(y) > max_length:
+        y = y[:max_length].copy() # Copy, so that the full signal is freed
+    instrument_name, style, pitch = SampleLibrary.parse_sample_path(path)
+    return BaseSample(instrument=instrument_name, style=style, pitch=pitch, y=y, sr=sr)
 
 # TODO: Set instruments and styles in enum-style
 class SampleLibrary:
     instruments: dict[str, InstrumentInfo]
     known_instruments_by_pitch: dict[int: (str, str)]
     samples: dict[str: dict[str: dict[int: BaseSample]]] # Access as samples[instrument][style][pitch] -> BaseSample
+    samples_by_id: list[BaseSample] # Access as samples_by_id[sample.id] -> BaseSample
+    sample_instrument_ids: np.ndarray # Index into instrument_names for every sample id
+    sample_style_ids: np.ndarray # Index into style_names for every sample id
+    sample_pitches: np.ndarray # Pitch value for every sample id
     
-    def __init__(self, path='./audio/StructuredSamples/'):
+    def __init__(self, path='./audio/StructuredSamples/', calc_stft:bool=False, dtype=np.float32, cache_path:str=None, 
+                 lazy:bool=False, max_cache_bytes:int=2**30, loader:str="process", n_workers:int=None, 
+                 window_length:int=None, hold_padding:int=0):
+        """Loads the sample library.
+
+        Parameters
+        ----------
+        path : str, optional
+            Path to the sample library, by default './audio/StructuredSamples/'
+        calc_stft : bool, optional
+            If True, precomputes the complex stft of every sample, 
+            so that individuals can be evaluated without calling librosa.stft, by default False.
+        dtype : np.dtype, optional
+            Precision of the sample audio, by default np.float32. 
+            Mixes and cached stfts inherit it (np.complex64 for np.float32).
+            Use np.float64 for the reference precision.
+        cache_path : str, optional
+            Folder of a compiled library (see SampleLibrary.compile). If it holds an up-to-date
+            compilation of path, the audio is memory-mapped from it instead of being decoded.
+            Otherwise the samples are decoded and compiled to cache_path for the next run.
+            No cache is used if None (default).
+        lazy : bool, optional
+            If True, only the index of (instrument, style, pitch) is built from the file names and 
+            the audio of a sample is decoded on its first access through get_sample, by default False.
+            Decoded samples are kept in an LRU cache bounded by max_cache_bytes.
+        max_cache_bytes : int, optional
+            Memory budget of the decoded samples (audio and stfts) in lazy mode, by default 1 GiB.
+            The least recently used samples are dropped from the cache once it is exceeded.
+            This only bounds the cache itself: a dropped sample stays in memory as long as an individual 
+            (or anything else) still references it, and is decoded again as a separate copy on its next access.
+            The memory used by samples is therefore at most max_cache_bytes plus the samples 
+            referenced by the population and its archive.
+        loader : str, optional
+            How the sample files are decoded, see load_samples. 'process' (default) decodes in a process pool,
+            'thread' in a thread pool and 'single' in the calling thread.
+        n_workers : int, optional
+            Number of worker processes or threads. Uses one per CPU core if None.
+        window_length : int, optional
+            Length of the analysis window in samples, e.g. stft.SNIPPET_LENGTH for the 1-second fitness.
+            If given, only the first window_length + hold_padding samples of each sample are kept in memory.
+            Keeps the full samples if None (default), which mixes of whole pieces need.
+            A compiled library (cache_path) always stores the full samples, the window only applies to the loaded views.
+        hold_padding : int, optional
+            Extra samples kept beyond window_length, by default 0. The library applies no offset itself,
+            this only lengthens the kept prefix. Needed for held notes that are mixed from an offset
+            into the sample, e.g. y[hold_delay:] in create_true_aam_populations_holds.py,
+            which need hold_padding >= hold_delay to still cover a full window.
+
+        Raises
+        ------
+        ValueError
+            If lazy is combined with cache_path. A compiled library is memory-mapped, which is lazy already.
+        """
+        self._init_empty(dtype=dtype)
+        self.set_window(window_length=window_length, hold_padding=hold_padding)
+        if lazy:
+            if cache_path is not None:
+                raise ValueError("lazy can not be combined with cache_path, compiled libraries are memory-mapped and loaded on access already.")
+            self.lazy = True
+            self.max_cache_bytes = max_cache_bytes
+            self.index_sample_files(path=path)
+        elif cache_path is not None and self.is_compiled(path=path, cache_path=cache_path, dtype=dtype):
+            self.load_compiled(cache_path=cache_path)
+        else:
+            max_sample_length = self.max_sample_length
+            if cache_path is not None:
+                # Compile the full samples, so that the cache does not depend on the window. They are cut in _index_samples
+                self.max_sample_length = None
+            self.load_samples(path=path, loader=loader, n_workers=n_workers)
+            self.max_sample_length = max_sample_length
+            if cache_path is not None:
+                self.write_compiled(cache_path=cache_path, fingerprint=self.fingerprint(path, dtype))
+        self._index_samples(calc_stft=calc_stft)
+
+    @classmethod
+    def compile(cls, path='./audio/StructuredSamples/', cache_path='./audio/CompiledSamples/', dtype=np.float32, force:bool=False, 
+                loader:str="process", n_workers:int=None) -> str:
+        """Decodes all samples under path once and writes them to a compiled library in cache_path:
+        a single contiguous .npy file with the audio of all samples and a JSON index of
+        (instrument, style, pitch, offset, length, sr) entries into it.
+        Libraries created with SampleLibrary(path, cache_path=cache_path) then memory-map 
+        the audio instead of decoding every file.
+
+        Parameters
+        ----------
+        path : str, optional
+            Path to the sample library, by default './audio/StructuredSamples/'
+        cache_path : str, optional
+            Folder the compiled library is written to, by default './audio/CompiledSamples/'
+        dtype : np.dtype, optional
+            Precision of the stored audio, by default np.float32
+        force : bool, optional
+            If True, recompiles even if cache_path holds an up-to-date compilation, by default False.
+        loader : str, optional
+            How the sample files are decoded, see load_samples, by default 'process'
+        n_workers : int, optional
+            Number of worker processes or threads. Uses one per CPU core if None.
+
+        Returns
+        -------
+        str
+            Fingerprint of the compiled library.
+        """
+        fingerprint = cls.fingerprint(path, dtype)
+        if force or not cls.is_compiled(path=path, cache_path=cache_path, dtype=dtype):
+            sample_lib = cls.__new__(cls)
+            sample_lib._init_empty(dtype=dtype)
+            sample_lib.load_samples(path=path, loader=loader, n_workers=n_workers)
+            sample_lib.write_compiled(cache_path=cache_path, fingerprint=fingerprint)
+        return fingerprint
+
+    @staticmethod
+    def fingerprint(path:str, dtype=np.float32) -> str:
+        """Hashes the relative path, size and modification time of every sample file under path,
+        together with the dtype and the compiled format version. A compiled library is out of date
+        as soon as any sample file is added, removed or modified.
+        File stats stand in for the file contents, so that checking the cache stays cheap.
+
+        Parameters
+        ----------
+        path : str
+            Path to the sample library.
+        dtype : np.dtype, optional
+            Precision of the compiled audio, by default np.float32
+
+        Returns
+        -------
+        str
+            Hex digest of the sample files.
+        """
+        digest = hashlib.sha256(f"{COMPILED_FORMAT_VERSION}|{np.dtype(dtype).str}".encode())
+        for file in sorted(glob(path + "**/*.wav", recursive=True)):
+            stat = os.stat(file)
+            digest.update(f"|{os.path.relpath(file, path)}|{stat.st_size}|{stat.st_mtime_ns}".encode())
+        return digest.hexdigest()
+
+    @classmethod
+    def is_compiled(cls, path:str, cache_path:str, dtype=np.float32) -> bool:
+        """Returns True if cache_path holds a compiled library that is up to date with the samples under path.
+        """
+        index_file = os.path.join(cache_path, COMPILED_INDEX_FILE)
+        if not os.path.isfile(index_file) or not os.path.isfile(os.path.join(cache_path, COMPILED_AUDIO_FILE)):
+            return False
+        with open(index_file, "r") as fp:
+            index = json.load(fp)
+        return index.get("fingerprint") == cls.fingerprint(path, dtype)
+
+    def write_compiled(self, cache_path:str, fingerprint:str) -> None:
+        """Writes the loaded samples to a compiled library in cache_path.
+        The index is written last, so that an interrupted compilation is never mistaken for a valid one.
+
+        Parameters
+        ----------
+        cache_path : str
+            Folder the compiled library is written to.
+        fingerprint : str
+            Fingerprint of the sample files the samples were loaded from, see SampleLibrary.fingerprint.
+        """
+        os.makedirs(cache_path, exist_ok=True)
+        samples = sorted(self._init_samples, key=lambda sample: (sample.instrument, sample.style, sample.pitch.value))
+        entries = []
+        offset = 0
+        for sample in samples:
+            entries.append({"instrument": sample.instrument, "style": sample.style, "pitch": sample.pitch.name, 
+                            "offset": offset, "length": len(sample.y), "sr": sample.sr})
+            offset += len(sample.y)
+
+        audio_file = os.path.join(cache_path, COMPILED_AUDIO_FILE)
+        index_file = os.path.join(cache_path, COMPILED_INDEX_FILE)
+        if os.path.isfile(index_file):
+            os.remove(index_file)
+        if offset == 0:
+            # Empty library, which can not be memory-mapped
+            np.save(audio_file, np.empty(0, dtype=self.dtype))
+        else:
+            audio = np.lib.format.open_memmap(audio_file, mode='w+', dtype=self.dtype, shape=(offset,))
+            for sample, entry in zip(samples, entries):
+                audio[entry["offset"]:entry["offset"] + entry["length"]] = sample.y
+            audio.flush()
+            del audio
+        index = {"fingerprint": fingerprint, "version": COMPILED_FORMAT_VERSION, "dtype": np.dtype(self.dtype).str, "samples": entries}
+        with open(index_file + ".tmp", "w") as fp:
+            json.dump(index, fp)
+        os.replace(index_file + ".tmp", index_file)
+
+    def load_compiled(self, cache_path:str) -> None:
+        """Loads the samples of a compiled library. The audio of every sample 
+        is a read-only view into the memory-mapped audio file, so nothing is decoded or copied.
+
+        Parameters
+        ----------
+        cache_path : str
+            Folder of the compiled library, see SampleLibrary.compile.
+        """
+        with open(os.path.join(cache_path, COMPILED_INDEX_FILE), "r") as fp:
+            index = json.load(fp)
+        # An empty library can not be memory-mapped
+        audio = np.load(os.path.join(cache_path, COMPILED_AUDIO_FILE), mmap_mode='r' if len(index["samples"]) > 0 else None)
+        self.dtype = audio.dtype.type
+        for entry in index["samples"]:
+            pitch = self.parse_pitch(entry["instrument"], entry["pitch"])
+            y = audio[entry["offset"]:entry["offset"] + entry["length"]]
+            self._init_samples.append(BaseSample(instrument=entry["instrument"], style=entry["style"], pitch=pitch, y=y, sr=entry["sr"]))
+
+    @classmethod
+    def from_samples(cls, samples:list[BaseSample], calc_stft:bool=False, dtype=np.float32, window_length:int=None, hold_padding:int=0):
+        """Creates a library from already loaded samples instead of reading audio files.
+
+        Parameters
+        ----------
+        samples : list[BaseSample]
+            Samples that make up the library.
+        calc_stft : bool, optional
+            If True, precomputes the complex stft of every sample, by default False.
+        dtype : np.dtype, optional
+            Precision of the sample audio, by default np.float32. The samples are cast to it.
+        window_length : int, optional
+            Length of the analysis window, see __init__. Keeps the full samples if None (default).
+        hold_padding : int, optional
+            Extra samples kept beyond window_length, see __init__, by default 0.
+
+        Returns
+        -------
+        SampleLibrary
+            Library containing the given samples.
+        """
+        sample_lib = cls.__new__(cls)
+        sample_lib._init_empty(dtype=dtype)
+        sample_lib.set_window(window_length=window_length, hold_padding=hold_padding)
+        for sample in samples:
+            sample.y = np.asarray(sample.y, dtype=dtype)
+        sample_lib._init_samples = list(samples)
+        sample_lib._index_samples(calc_stft=calc_stft)
+        return sample_lib
+
+    def _init_empty(self, dtype) -> None:
+        self.dtype = dtype
         self.instruments = dict() # Holds Name: InstrumentInfo pairs of the known instruments
         self.known_instruments_by_pitch = dict() # Holds lists of valid instruments+styles for a given pitch
         self.samples = dict()
         self._init_samples = []
-        self.load_samples_multithreaded(path=path, n_threads=8)
-        # self.load_samples_single_thread(path)
+        # Dense sample ids, see assign_sample_ids
+        self.samples_by_id = []
+        self.instrument_names = []
+        self.style_names = []
+        self.sample_instrument_ids = np.empty(0, dtype=np.int32)
+        self.sample_style_ids = np.empty(0, dtype=np.int32)
+        self.sample_pitches = np.empty(0, dtype=np.int32)
+        # Lazy mode, see __init__
+        self.lazy = False
+        self.max_cache_bytes = None
+        self.calc_stft_on_load = False
+        self.sample_paths = dict() # Holds (instrument, style, pitch value): file path pairs
+        self._sample_cache = OrderedDict() # Decoded samples in order of their last access
+        self._sample_cache_bytes = 0
+        self.max_sample_length = None # Number of leading samples kept of each sample's audio, all if None
+        # Per-sample magnitude sums, see calc_sample_magnitude_sums
+        self.sample_magnitude_sums = None
+        self.sample_n_frames = None
+        # Spectral nearest-neighbour index, see build_spectral_index
+        self.sample_spectra = None
+        self.spectral_neighbors = None
+        self.load_stats = dict() # Throughput of the last load_samples call
+
+    def set_window(self, window_length:int=None, hold_padding:int=0) -> None:
+        """Sets how much audio of each sample is kept, see __init__. Only affects samples loaded afterwards.
+        """
+        self.max_sample_length = window_length + hold_padding if window_length is not None else None
+
+    def _truncate(self, y:np.ndarray) -> np.ndarray:
+        """Cuts the audio of a sample to self.max_sample_length.
+        """
+        if self.max_sample_length is None or len(y) <= self.max_sample_length:
+            return y
+        if isinstance(y, np.memmap):
+            return y[:self.max_sample_length] # View into a compiled library, the cut part is never paged in
+        return y[:self.max_sample_length].copy() # Copy, so that the full signal is freed
+
+    def _index_samples(self, calc_stft:bool) -> None:
+        """Builds the lookup structures from the loaded samples in self._init_samples.
+        """
+        for sample in self._init_samples:
+            if sample.y is not None:
+                sample.y = self._truncate(sample.y)
         self.create_sample_dict()
         self.extract_instrument_info()
-        pass
+        self.assign_sample_ids()
+        self.build_sampling_tables()
+        if self.lazy:
+            self.calc_stft_on_load = calc_stft
+        elif calc_stft:
+            self.calc_sample_stfts()
+
+    def load_samples(self, path:str, loader:str="process", n_workers:int=None, chunksize:int=None) -> dict:
+        """Loads the samples contained in the subfolders of path.
+        Files are decoded in sorted order and the samples are kept in that order, whichever loader is used.
+        Decoding and resampling in librosa.load mostly hold the GIL, so only the process loader scales with the cores.
+
+        Parameters
+        ----------
+        path : str
+            Path to the sample library.
+        loader : str, optional
+            'process' to decode in a process pool (default), 'thread' for a thread pool or 'single' for the calling thread.
+        n_workers : int, optional
+            Number of worker processes or threads. Uses one per CPU core (at most one per file) if None.
+        chunksize : int, optional
+            Number of files sent to a worker at once. Chosen so that every worker gets about 4 chunks if None.
+
+        Returns
+        -------
+        dict
+            Throughput of the loader: files, bytes decoded, seconds, files_per_sec and bytes_per_sec.
+            Also kept in self.load_stats.
+
+        Raises
+        ------
+        ValueError
+            If the loader is unknown.
+        """
+        wav_files = sorted(glob(path + "**/*.wav", recursive=True))
+        # wav_files = [file for file in wav_files if "Drums" not in file]
+        if n_workers is None:
+            n_workers = os.cpu_count() or 1
+        n_workers = max(1, min(n_workers, len(wav_files)))
+        if chunksize is None:
+            chunksize = max(1, len(wav_files) // (4 * n_workers))
+        decode = partial(decode_sample_file, dtype=self.dtype, max_length=self.max_sample_length)
+
+        start = time.perf_counter()
+        if loader == "process":
+            samples = process_map(decode, wav_files, max_workers=n_workers, chunksize=chunksize, desc="Loading samples")
+        elif loader == "thread":
+            samples = thread_map(decode, wav_files, max_workers=n_workers, chunksize=chunksize, desc="Loading samples")
+        elif loader == "single":
+            samples = [decode(file) for file in tqdm(wav_files, desc="Loading samples")]
+        else:
+            raise ValueError(f"Unknown loader '{loader}'. Use 'process', 'thread' or 'single'.")
+        seconds = time.perf_counter() - start
+        self._init_samples.extend(samples)
+
+        n_bytes = sum(sample.y.nbytes for sample in samples)
+        self.load_stats = {"loader": loader, "n_workers": n_workers, "chunksize": chunksize, "files": len(samples), "bytes": n_bytes, "seconds": seconds,
+                           "files_per_sec": len(samples) / seconds if seconds > 0 else np.inf, 
+                           "bytes_per_sec": n_bytes / seconds if seconds > 0 else np.inf}
+        return self.load_stats
 
     def load_samples_multithreaded(self, path:str, n_threads:int) -> None:
         """Loads the samples contained in the the subfolders of path.
@@ -37,9 +412,7 @@ class SampleLibrary:
         n_threads : int
             Number of threads with which to load the files for better performance.
         """
-        wav_files = glob(path + "**/*.wav", recursive=True)
-        # wav_files = [file for file in wav_files if "Drums" not in file]
-        thread_map(self.load_file, wav_files, max_workers=n_threads, chunksize=len(wav_files)//n_threads//10, desc="Loading samples")
+        self.load_samples(path=path, loader="thread", n_workers=n_threads)
     
     def load_file(self, path:str) -> None:
         """Loads a single sample file at path.
@@ -49,9 +422,74 @@ class SampleLibrary:
         path : str
             Path to the sample file.
         """
-        y, sr = librosa.load(path)
+        self._init_samples.append(decode_sample_file(path, dtype=self.dtype, max_length=self.max_sample_length))
+
+    def index_sample_files(self, path:str) -> None:
+        """Indexes the samples in the subfolders of path by their file names, without decoding any audio.
+        The samples are decoded on access by load_lazy.
+
+        Parameters
+        ----------
+        path : str
+            Path to the sample library.
+        """
+        for file in sorted(glob(path + "**/*.wav", recursive=True)):
+            instrument_name, style, pitch = self.parse_sample_path(file)
+            self.sample_paths[(instrument_name, style, pitch.value)] = file
+            self._init_samples.append(FlatSample(instrument=instrument_name, style=style, pitch=pitch))
+
+    def load_lazy(self, sample:BaseSample) -> BaseSample:
+        """Returns the decoded version of an indexed sample, from the LRU cache if possible.
+        Evicts the least recently used samples if the cache exceeds max_cache_bytes.
+        Evicted samples are only freed once nothing else references them, see __init__.
+
+        Parameters
+        ----------
+        sample : BaseSample
+            Indexed sample without audio, see index_sample_files.
 
-        # Get instrument name, style and note from file path
+        Returns
+        -------
+        BaseSample
+            Sample with its audio (and stft, if calc_stft was set).
+        """
+        key = (sample.instrument, sample.style, sample.pitch.value)
+        loaded = self._sample_cache.get(key)
+        if loaded is not None:
+            self._sample_cache.move_to_end(key)
+            return loaded
+        y, sr = librosa.load(self.sample_paths[key], dtype=self.dtype)
+        y = self._truncate(y)
+        loaded = BaseSample(instrument=sample.instrument, style=sample.style, pitch=sample.pitch, y=y, sr=sr)
+        loaded.id = sample.id
+        if self.calc_stft_on_load:
+            loaded.stft = snippet_stft(y)
+        self._sample_cache[key] = loaded
+        self._sample_cache_bytes += self._sample_nbytes(loaded)
+        # Always keep the requested sample, even if it exceeds the budget on its own
+        while self._sample_cache_bytes > self.max_cache_bytes and len(self._sample_cache) > 1:
+            _, evicted = self._sample_cache.popitem(last=False)
+            self._sample_cache_bytes -= self._sample_nbytes(evicted)
+        return loaded
+
+    @staticmethod
+    def _sample_nbytes(sample:BaseSample) -> int:
+        return sample.y.nbytes + (sample.stft.nbytes if sample.stft is not None else 0)
+
+    @staticmethod
+    def parse_sample_path(path:str) -> Tuple[str, str, Union[Pitch, DrumHit]]:
+        """Gets instrument name, style and pitch of a sample from its file path.
+
+        Parameters
+        ----------
+        path : str
+            Path to the sample file.
+
+        Returns
+        -------
+        Tuple[str, str, Union[Pitch, DrumHit]]
+            Instrument name, style and pitch of the sample.
+        """
         instrument_name, tail = path.split(
             "StructuredSamples\\")[1].split("\\", maxsplit=1)
         style, tail = tail.split("\\")[-2:]
@@ -65,10 +503,15 @@ class SampleLibrary:
                     break
         else:
             pitch = Pitch[pitch_str]
+        return instrument_name, style, pitch
 
-        sample = BaseSample(instrument=instrument_name, style=style, pitch=pitch, y=y, sr=sr)
-
-        self._init_samples.append(sample)
+    @staticmethod
+    def parse_pitch(instrument_name:str, pitch_name:str) -> Union[Pitch, DrumHit]:
+        """Returns the Pitch (or DrumHit for drums) with the given name.
+        """
+        if instrument_name == "Drums":
+            return DrumHit[pitch_name]
+        return Pitch[pitch_name]
 
     def load_samples_single_thread(self, path:str) -> None:
         """Loads all samples in the subfolders of path in a single thread.
@@ -78,9 +521,227 @@ class SampleLibrary:
         path : str
             Path to the sample library.
         """
-        wav_files = glob(path + "**/*.wav", recursive=True)
-        for file in tqdm(wav_files):
-            self.load_file(file)
+        self.load_samples(path=path, loader="single")
+
+    def iter_samples(self):
+        """Iterates over all samples contained in the library.
+        In lazy mode, these are the indexed samples without audio.
+
+        Yields
+        ------
+        BaseSample
+            Sample object from the library.
+        """
+        for styles in self.samples.values():
+            for pitches in styles.values():
+                yield from pitches.values()
+
+    def assign_sample_ids(self) -> None:
+        """Assigns every sample a dense integer id (sample.id), in the order of (instrument, style, pitch),
+        and builds the id-indexed arrays of instrument, style and pitch.
+        An individual can then be stored as a small array of sample ids, see BaseIndividual.genome.
+        """
+        self.samples_by_id = sorted(self.iter_samples(), key=lambda sample: (sample.instrument, sample.style, sample.pitch.value))
+        self.instrument_names = sorted(self.instruments)
+        self.style_names = sorted({sample.style for sample in self.samples_by_id})
+        instrument_ids = {name: i for i, name in enumerate(self.instrument_names)}
+        style_ids = {name: i for i, name in enumerate(self.style_names)}
+        for sample_id, sample in enumerate(self.samples_by_id):
+            sample.id = sample_id
+        self.sample_instrument_ids = np.array([instrument_ids[sample.instrument] for sample in self.samples_by_id], dtype=np.int32)
+        self.sample_style_ids = np.array([style_ids[sample.style] for sample in self.samples_by_id], dtype=np.int32)
+        self.sample_pitches = np.array([sample.pitch.value for sample in self.samples_by_id], dtype=np.int32)
+
+    def build_sampling_tables(self) -> None:
+        """Precomputes the tables behind the random draws, so that no draw has to build lists from sets.
+        Since sample ids are sorted by (instrument, style, pitch), every instrument and every (instrument, style) 
+        group covers a contiguous range of ids, and a hierarchical uniform draw reduces to three scaled random numbers.
+        Styles, pitches and the valid (instrument, style) groups per pitch are kept in sorted order,
+        so that draws are reproducible for a given seed.
+        """
+        self._styles_by_instrument = {name: sorted(self.instruments[name].styles) for name in self.instrument_names}
+        self._pitches_by_style = {(name, style): sorted(self.instruments[name].pitches[style]) 
+                                  for name in self.instrument_names for style in self._styles_by_instrument[name]}
+        groups = list(self._pitches_by_style) # (instrument, style) pairs in id order
+        group_ids = {group: i for i, group in enumerate(groups)}
+        self._groups = groups
+        self._instrument_group_start = np.zeros(len(self.instrument_names), dtype=np.int64)
+        self._instrument_group_count = np.array([len(self._styles_by_instrument[name]) for name in self.instrument_names], dtype=np.int64)
+        self._instrument_group_start[1:] = np.cumsum(self._instrument_group_count)[:-1]
+        self._group_sample_count = np.array([len(self._pitches_by_style[group]) for group in groups], dtype=np.int64)
+        self._group_sample_start = np.zeros(len(groups), dtype=np.int64)
+        self._group_sample_start[1:] = np.cumsum(self._group_sample_count)[:-1]
+
+        # Valid groups per pitch value, as a compressed sparse row table: groups of pitch p are _pitch_groups[_pitch_group_ptr[p]:_pitch_group_ptr[p+1]]
+        n_pitch_values = int(self.sample_pitches.max()) + 1 if len(self.sample_pitches) > 0 else 0
+        groups_by_pitch = [sorted(group_ids[group] for group in self.known_instruments_by_pitch.get(p, ())) for p in range(n_pitch_values)]
+        self._pitch_group_ptr = np.zeros(n_pitch_values + 1, dtype=np.int64)
+        self._pitch_group_ptr[1:] = np.cumsum([len(pitch_groups) for pitch_groups in groups_by_pitch])
+        self._pitch_groups = np.array([group for pitch_groups in groups_by_pitch for group in pitch_groups], dtype=np.int64)
+        # Sample id of every (group, pitch value) pair, -1 if the group has no sample of that pitch
+        self._group_pitch_ids = np.full((len(groups), n_pitch_values), -1, dtype=np.int64)
+        group_of_sample = np.repeat(np.arange(len(groups)), self._group_sample_count)
+        self._group_pitch_ids[group_of_sample, self.sample_pitches] = np.arange(len(self.samples_by_id))
+
+    def draw_sample_ids_uniform(self, n:int, rng:np.random.Generator=None) -> np.ndarray:
+        """Draws the ids of n random samples in one vectorized call, 
+        with the same hierarchical distribution as get_random_sample_uniform.
+
+        Parameters
+        ----------
+        n : int
+            Number of samples to draw.
+        rng : np.random.Generator, optional
+            Random generator to draw with. Uses numpy's global random state if None.
+
+        Returns
+        -------
+        np.ndarray[int]
+            Ids of the drawn samples, see get_sample_by_id.
+        """
+        rng = np.random if rng is None else rng
+        instruments = (rng.random(n) * len(self.instrument_names)).astype(np.int64)
+        groups = self._instrument_group_start[instruments] + (rng.random(n) * self._instrument_group_count[instruments]).astype(np.int64)
+        return self._group_sample_start[groups] + (rng.random(n) * self._group_sample_count[groups]).astype(np.int64)
+
+    def draw_sample_ids_for_pitches(self, pitches:np.ndarray, rng:np.random.Generator=None) -> np.ndarray:
+        """Draws a random valid (instrument, style) for each of the given pitches in one vectorized call, 
+        with the same distribution as get_random_instrument_for_pitch, and returns the ids of the resulting samples.
+
+        Parameters
+        ----------
+        pitches : np.ndarray[int]
+            Pitch values to draw samples for.
+        rng : np.random.Generator, optional
+            Random generator to draw with. Uses numpy's global random state if None.
+
+        Returns
+        -------
+        np.ndarray[int]
+            Ids of the drawn samples, see get_sample_by_id.
+
+        Raises
+        ------
+        KeyError
+            If no sample of one of the pitches is contained in the library.
+        """
+        rng = np.random if rng is None else rng
+        pitches = np.asarray(pitches, dtype=np.int64)
+        if np.any(pitches < 0) or np.any(pitches >= len(self._pitch_group_ptr) - 1):
+            raise KeyError(f"No samples for some of the pitches {pitches}.")
+        starts = self._pitch_group_ptr[pitches]
+        counts = self._pitch_group_ptr[pitches + 1] - starts
+        if np.any(counts == 0):
+            raise KeyError(f"No samples for pitches {pitches[counts == 0]}.")
+        groups = self._pitch_groups[starts + (rng.random(len(pitches)) * counts).astype(np.int64)]
+        return self._group_pitch_ids[groups, pitches]
+
+    def get_random_samples_uniform(self, n:int, rng:np.random.Generator=None) -> list[BaseSample]:
+        """Draws n samples at once, see draw_sample_ids_uniform.
+
+        Parameters
+        ----------
+        n : int
+            Number of samples to draw.
+        rng : np.random.Generator, optional
+            Random generator to draw with. Uses numpy's global random state if None.
+
+        Returns
+        -------
+        list[BaseSample]
+            Uniformly drawn random samples from the library.
+        """
+        return [self.get_sample_by_id(sample_id) for sample_id in self.draw_sample_ids_uniform(n, rng=rng)]
+
+    def calc_sample_magnitude_sums(self) -> None:
+        """Precomputes, for every sample id, the magnitude spectrum summed over the stft frames 
+        that the fitness analyses (self.sample_magnitude_sums, shape (n_samples, n_bins)) 
+        and the number of these frames (self.sample_n_frames).
+        The time-averaged magnitude spectrum of a mix is approximated by the sum of its samples' 
+        magnitude sums divided by the number of frames of the mix, see fitness.additive_abs_spectrum.
+        In lazy mode, this decodes every sample once.
+        """
+        sums = []
+        frames = []
+        for sample_id in range(len(self.samples_by_id)):
+            sample = self.get_sample_by_id(sample_id)
+            stft = sample.stft if sample.stft is not None else snippet_stft(sample.y)
+            frames.append(n_frames(len(sample.y)))
+            sums.append(np.sum(np.abs(stft[:, :frames[-1]]), axis=1))
+        self.sample_magnitude_sums = np.array(sums, dtype=self.dtype).reshape(len(sums), 1 + N_FFT // 2)
+        self.sample_n_frames = np.array(frames, dtype=np.int64)
+
+    def has_magnitude_sums(self) -> bool:
+        """Returns True if calc_sample_magnitude_sums has been called.
+        """
+        return self.sample_magnitude_sums is not None
+
+    def build_spectral_index(self, k:int=10, chunksize:int=1024) -> None:
+        """Precomputes the mean magnitude spectrum of every sample (over the first second, as the fitness sees it) 
+        and the k spectrally nearest samples of every sample under the cosh distance.
+        Since mean(a/b + b/a) - 2 is a sum of two matrix products of the spectra and their reciprocals,
+        all pairwise distances are computed chunk by chunk as matrix products.
+        In lazy mode, this decodes every sample once.
+
+        Parameters
+        ----------
+        k : int, optional
+            Number of neighbours per sample, by default 10
+        chunksize : int, optional
+            Number of samples whose distances are computed at once, by default 1024
+        """
+        if not self.has_magnitude_sums():
+            self.calc_sample_magnitude_sums()
+        self.sample_spectra = (self.sample_magnitude_sums / self.sample_n_frames[:, np.newaxis]).astype(np.float32)
+
+        n_samples, n_bins = self.sample_spectra.shape
+        k = max(0, min(k, n_samples - 1))
+        spectra = np.maximum(self.sample_spectra.astype(np.float64), 1e-10) # Silent bins would make the distance infinite
+        inv_spectra = 1 / spectra
+        self.spectral_neighbors = np.empty((n_samples, k), dtype=np.int64)
+        for start in range(0, n_samples, chunksize):
+            end = min(start + chunksize, n_samples)
+            distances = (spectra[start:end] @ inv_spectra.T + inv_spectra[start:end] @ spectra.T) / n_bins - 2
+            distances[np.arange(end - start), np.arange(start, end)] = np.inf # A sample is not its own neighbour
+            if k == 0:
+                continue
+            nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+            order = np.argsort(np.take_along_axis(distances, nearest, axis=1), axis=1)
+            self.spectral_neighbors[start:end] = np.take_along_axis(nearest, order, axis=1)
+
+    def has_spectral_index(self) -> bool:
+        """Returns True if build_spectral_index has been called.
+        """
+        return self.spectral_neighbors is not None
+
+    def get_spectral_neighbors(self, sample_id:int) -> np.ndarray:
+        """Returns the ids of the spectrally nearest samples of a sample, closest first.
+
+        Parameters
+        ----------
+        sample_id : int
+            Id of the sample.
+
+        Returns
+        -------
+        np.ndarray[int]
+            Ids of the k nearest samples, see build_spectral_index.
+
+        Raises
+        ------
+        ValueError
+            If the spectral index has not been built.
+        """
+        if self.spectral_neighbors is None:
+            raise ValueError("Spectral index not built, call build_spectral_index first.")
+        return self.spectral_neighbors[sample_id]
+
+    def calc_sample_stfts(self) -> None:
+        """Precomputes the complex stft of the first second of each sample (see stft.snippet_stft).
+        The stft of a mix is then the sum of the stfts of its samples.
+        """
+        for sample in tqdm(list(self.iter_samples()), desc="Calculating sample stfts"):
+            sample.stft = snippet_stft(sample.y)
 
     def extract_instrument_info(self):
         for instrument in self.instruments.values():
@@ -144,9 +805,35 @@ class SampleLibrary:
         if style is None:
             style = self.get_random_style_for_instrument(instrument_name=instrument)
         try: 
-            return self.samples[instrument][style][pitch]
+            sample = self.samples[instrument][style][pitch]
         except:
             raise KeyError()
+        if self.lazy:
+            return self.load_lazy(sample)
+        return sample
+
+    def get_sample_by_id(self, sample_id:int) -> BaseSample:
+        """Returns the sample with the given id, see assign_sample_ids.
+
+        Parameters
+        ----------
+        sample_id : int
+            Dense id of the sample.
+
+        Returns
+        -------
+        BaseSample
+            Sample object from the library
+
+        Raises
+        ------
+        IndexError
+            If no sample with this id exists.
+        """
+        sample = self.samples_by_id[sample_id]
+        if self.lazy:
+            return self.load_lazy(sample)
+        return sample
 
     def get_random_sample_uniform(self) -> BaseSample:
         """Gets a uniform random sample from the library. 
@@ -159,10 +846,7 @@ class SampleLibrary:
         BaseSample
             Uniformly drawn random sample from the library.
         """
-        instrument = np.random.choice(list(self.instruments.values()))
-        style = np.random.choice(list(instrument.styles))
-        pitch = np.random.choice(list(instrument.pitches[style]))
-        return self.get_sample(instrument.name, style, pitch)
+        return self.get_sample_by_id(self.draw_sample_ids_uniform(1)[0])
 
     def get_random_instrument_for_pitch(self, pitch:Union[Pitch, DrumHit]) -> Tuple[str, str]:
         """Helper function to draw a random instrument that is valid for the provided pitch.
@@ -177,8 +861,11 @@ class SampleLibrary:
         Tuple[str, str]
             Name of the drawn instrument and style.
         """
-        idx = np.random.choice(len(self.known_instruments_by_pitch[pitch]))
-        return list(self.known_instruments_by_pitch[pitch])[idx]
+        pitch_value = int(pitch)
+        if pitch_value not in self.known_instruments_by_pitch:
+            raise KeyError(pitch)
+        start, end = self._pitch_group_ptr[pitch_value], self._pitch_group_ptr[pitch_value + 1]
+        return self._groups[self._pitch_groups[np.random.randint(start, end)]]
 
     def get_random_style_for_instrument(self, instrument_name:str) -> str:
         """Helper function to draw a random style for a provided instrument.
@@ -199,12 +886,40 @@ class SampleLibrary:
             If instrument was not found in the library.
         """
         if instrument_name in self.instruments:
-            instr_info = self.instruments[instrument_name]
             # Instrument found, return random style
-            return np.random.choice(list(instr_info.styles))
+            styles = self._styles_by_instrument[instrument_name]
+            return styles[np.random.randint(len(styles))]
         else:
             raise ValueError(f"Instrument '{instrument_name}' not found in sample library.")
 
+    def get_random_style_for_pitch(self, instrument_name:str, pitch:Union[Pitch, DrumHit]) -> str:
+        """Helper function to draw a random style of an instrument that has a sample of the given pitch.
+
+        Parameters
+        ----------
+        instrument_name : str
+            Desired instrument that the style must be valid for.
+        pitch : Union[Pitch, DrumHit]
+            Desired pitch that the style must have a sample of.
+
+        Returns
+        -------
+        str
+            Name of the style that was drawn.
+
+        Raises
+        ------
+        ValueError
+            If the instrument was not found in the library, or none of its styles has a sample of the pitch.
+        """
+        if instrument_name not in self.instruments:
+            raise ValueError(f"Instrument '{instrument_name}' not found in sample library.")
+        instr_info = self.instruments[instrument_name]
+        styles = [style for style in self._styles_by_instrument[instrument_name] if pitch in instr_info.pitches[style]]
+        if len(styles) == 0:
+            raise ValueError(f"Instrument '{instrument_name}' has no sample of pitch {int(pitch)}.")
+        return styles[np.random.randint(len(styles))]
+
     def get_random_pitch_for_instrument_uniform(self, instrument_name:str, style:str=None) -> Pitch: 
         """Helper function to draw a uniform random pitch for a given instrument and style.
         If no style is given, a random style is chosen for the instrument.
@@ -231,14 +946,17 @@ class SampleLibrary:
         if instrument_name in self.instruments:
             instr_info = self.instruments[instrument_name]
             if style in instr_info.pitches:
-                return np.random.choice(list(instr_info.pitches[style]))
+                pitches = self._pitches_by_style[(instrument_name, style)]
+                return pitches[np.random.randint(len(pitches))]
             else:
                 raise ValueError(f"Style '{style}' not valid for instrument {instrument_name}.")
         else:
             raise ValueError(f"Instrument '{instrument_name}' not found in sample library.")
     
     def get_shifted_pitch(self, instrument_name:str, style:str, old_pitch:Pitch, shift_by:int) -> Pitch:
-        """Returns a clipped, shifted value by shift_by halftones for a given instrument and style.
+        """Returns the pitch shifted by shift_by halftones for a given instrument and style.
+        The result is snapped to the closest pitch that the style has a sample of,
+        so that gaps in the style's pitches never lead to a missing sample.
 
         Parameters
         ----------
@@ -254,7 +972,8 @@ class SampleLibrary:
         Returns
         -------
         Pitch
-            The old_pitch shifted by shift_by steps, or the min/max pitches supported by the instrument.
+            The valid pitch closest to old_pitch shifted by shift_by steps, 
+            which is the min/max pitch of the style if the shift leaves its range.
 
         Raises
         ------
@@ -266,21 +985,23 @@ class SampleLibrary:
         if instrument_name in self.instruments:
             instr_info = self.instruments[instrument_name]   
             if style in instr_info.styles:     
-                old_pitch_num = old_pitch.value
-                new_pitch_num = int(np.clip(old_pitch_num + shift_by, a_min=20, a_max=108))
-                new_pitch = Pitch(new_pitch_num)
-                # Handle shift out of bounds for instrument (Clip to instrument range)
-                if new_pitch > instr_info.max_pitches[style]:
-                    new_pitch = instr_info.max_pitches[style]
-                elif new_pitch < instr_info.min_pitches[style]:
-                    new_pitch = instr_info.min_pitches[style]
-                # return new pitch
-                return new_pitch
+                # Closest pitch the style has a sample of, which also clips to the style's range
+                return instr_info.nearest_valid_pitch(style, int(old_pitch) + shift_by)
             else:
                 raise ValueError(f"Style '{style}' not valid for instrument {instrument_name}.")
         else:
             raise ValueError(f"Instrument '{instrument_name}' not found in sample library.")
 
+    def get_dtype(self):
+        """Getter for the precision of the sample audio.
+
+        Returns
+        -------
+        np.dtype
+            dtype of the samples in the library.
+        """
+        return self.dtype
+
     def get_instrument_info(self, instrument_name):
         """Getter for instrument info objects associated with the given instrument name.
 
@@ -294,4 +1015,119 @@ class SampleLibrary:
         InstrumentInfo
             Data object that holds information about the instrument
         """
-        return self.instruments[instrument_name]
\ No newline at end of file
+        return self.instruments[instrument_name]
+
+class SharedSampleLibrary(SampleLibrary):
+    """SampleLibrary whose sample audio (and cached stfts) lives in shared memory.
+    Pickling an instance, e.g. to pass it to a multiprocessing.Process, only transfers the metadata
+    and the names of the shared memory blocks. The receiving process attaches to the blocks 
+    and gets read-only, zero-copy views of the samples, while all lookups run locally in that process.
+    Unlike a BaseManager proxy, no call to the library requires interprocess communication.
+
+    The creating process owns the shared memory and must release it with close(),
+    or by using the library as a context manager:
+
+        with SharedSampleLibrary() as sample_lib:
+            Process(target=run_experiment, args=(sample_lib,)).start()
+    """
+    def __init__(self, path='./audio/StructuredSamples/', **kwargs):
+        """Loads the sample library and moves it into shared memory. See SampleLibrary for the parameters.
+
+        Raises
+        ------
+        ValueError
+            If lazy is set, since lazily loaded samples can not be shared.
+        """
+        if kwargs.get("lazy", False):
+            raise ValueError("A SharedSampleLibrary can not be lazy, all samples are moved to shared memory on construction.")
+        super().__init__(path=path, **kwargs)
+
+    def _index_samples(self, calc_stft:bool) -> None:
+        super()._index_samples(calc_stft=calc_stft)
+        self._share()
+
+    def _share(self) -> None:
+        """Copies the audio and the cached stfts of all samples into new shared memory blocks
+        and replaces them by read-only views of the blocks.
+        """
+        samples = self.samples_by_id
+        self._layout = [] # (instrument, style, pitch, sr, offset, length) of every sample in the audio block, in id order
+        offset = 0
+        for sample in samples:
+            self._layout.append((sample.instrument, sample.style, sample.pitch, sample.sr, offset, len(sample.y)))
+            offset += len(sample.y)
+        self._owner = True
+        self._audio_shm = SharedMemory(create=True, size=max(1, offset * np.dtype(self.dtype).itemsize))
+        audio = np.ndarray((offset,), dtype=self.dtype, buffer=self._audio_shm.buf)
+        for sample, (_, _, _, _, offset, length) in zip(samples, self._layout):
+            audio[offset:offset + length] = sample.y
+
+        self._stft_shape = None
+        self._stft_dtype = None
+        self._stft_shm = None
+        if len(samples) > 0 and all(sample.stft is not None for sample in samples):
+            stft_dtype = self._stft_dtype = samples[0].stft.dtype
+            self._stft_shape = (len(samples),) + samples[0].stft.shape
+            self._stft_shm = SharedMemory(create=True, size=int(np.prod(self._stft_shape)) * stft_dtype.itemsize)
+            stfts = np.ndarray(self._stft_shape, dtype=stft_dtype, buffer=self._stft_shm.buf)
+            for i, sample in enumerate(samples):
+                stfts[i] = sample.stft
+        self._attach_views()
+
+    def _attach_views(self) -> None:
+        """(Re)builds the sample dictionary from the layout, with read-only views into the shared memory blocks.
+        """
+        audio = np.ndarray((self._audio_shm.size // np.dtype(self.dtype).itemsize,), dtype=self.dtype, buffer=self._audio_shm.buf)
+        audio.flags.writeable = False
+        stfts = None
+        if self._stft_shm is not None:
+            stfts = np.ndarray(self._stft_shape, dtype=self._stft_dtype, buffer=self._stft_shm.buf)
+            stfts.flags.writeable = False
+        self.samples = dict()
+        self.samples_by_id = []
+        for i, (instrument_name, style, pitch, sr, offset, length) in enumerate(self._layout):
+            sample = BaseSample(instrument=instrument_name, style=style, pitch=pitch, y=audio[offset:offset + length], sr=sr)
+            sample.id = i
+            if stfts is not None:
+                sample.stft = stfts[i]
+            self.samples_by_id.append(sample)
+            self.samples.setdefault(instrument_name, dict()).setdefault(style, dict())[pitch.value] = sample
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["samples"] = None
+        state["samples_by_id"] = None
+        state["_owner"] = False
+        state["_audio_shm"] = self._audio_shm.name
+        state["_stft_shm"] = self._stft_shm.name if self._stft_shm is not None else None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._audio_shm = SharedMemory(name=state["_audio_shm"])
+        self._stft_shm = SharedMemory(name=state["_stft_shm"]) if state["_stft_shm"] is not None else None
+        self._attach_views()
+
+    def close(self) -> None:
+        """Detaches this instance from the shared memory. The creating instance also frees the memory,
+        after which the library can not be passed to new processes anymore.
+        """
+        self.samples = dict()
+        self.samples_by_id = []
+        for shm in (self._audio_shm, self._stft_shm):
+            if shm is None:
+                continue
+            if self._owner:
+                shm.unlink()
+            try:
+                shm.close()
+            except BufferError:
+                pass # Samples are still referenced elsewhere, the mapping is released when they are
+        self._audio_shm = None
+        self._stft_shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
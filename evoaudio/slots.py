@@ -0,0 +1,32 @@
+class SlotsPickleMixin:
+    """Pickle support for classes with __slots__, which have no instance dict.
+    The state is a dict of all slots that are set, so that objects pickled
+    before their class used __slots__ (whose state is their instance dict) stay loadable.
+    Slots missing from an old state are set to the values in _slot_defaults.
+    """
+    __slots__ = ()
+    _slot_defaults = {}
+
+    @classmethod
+    def _all_slots(cls) -> list[str]:
+        return [slot for klass in cls.__mro__ for slot in klass.__dict__.get("__slots__", ()) if slot not in ("__dict__", "__weakref__")]
+
+    def __getstate__(self):
+        state = {slot: getattr(self, slot) for slot in self._all_slots() if hasattr(self, slot)}
+        if hasattr(self, "__dict__"):
+            # Subclasses without __slots__
+            state.update(self.__dict__)
+        return state
+
+    def __setstate__(self, state):
+        if isinstance(state, tuple):
+            # (instance dict, slots) as pickled by the default protocol
+            instance_dict, slot_state = state
+            state = {**(instance_dict or {}), **(slot_state or {})}
+        for key, value in self._slot_defaults.items():
+            setattr(self, key, value)
+        for key, value in state.items():
+            try:
+                setattr(self, key, value)
+            except AttributeError:
+                pass # Attribute that the class no longer has
@@ -0,0 +1,123 @@
+from typing import Callable, Union
+
+import librosa
+import numpy as np
+import scipy.fft
+import scipy.signal
+
+SNIPPET_LENGTH = 22050 # Length of the analysed snippets in samples, 1 second at 22050 Hz (Ginsel et. al 2022)
+N_FFT = 2048 # librosa.stft default
+HOP_LENGTH = N_FFT // 4 # librosa.stft default
+
+def n_frames(length:int) -> int:
+    """Returns the number of stft frames of a signal with the given length, cut to SNIPPET_LENGTH.
+
+    Parameters
+    ----------
+    length : int
+        Length of the signal in samples.
+
+    Returns
+    -------
+    int
+        Number of frames librosa.stft (center=True) produces for the cut signal.
+    """
+    return 1 + min(length, SNIPPET_LENGTH) // HOP_LENGTH
+
+def snippet_stft(y:np.ndarray) -> np.ndarray:
+    """Calculates the complex stft of the first SNIPPET_LENGTH samples of y.
+    Shorter signals are zero-padded to SNIPPET_LENGTH, so that the stfts of
+    different signals always have the same shape and can be summed.
+    Since librosa pads with zeros, the first n_frames(len(y)) frames
+    are identical to librosa.stft(y[:SNIPPET_LENGTH]).
+
+    Parameters
+    ----------
+    y : np.ndarray
+        Audio signal.
+
+    Returns
+    -------
+    np.ndarray
+        Complex stft matrix of shape (1 + N_FFT // 2, n_frames(SNIPPET_LENGTH)).
+    """
+    snippet = y[:SNIPPET_LENGTH]
+    return librosa.stft(np.pad(snippet, (0, SNIPPET_LENGTH - len(snippet))), n_fft=N_FFT, hop_length=HOP_LENGTH)
+
+class LibrosaSTFT:
+    """Reference stft backend that calls librosa.stft."""
+    def __init__(self, n_fft:int=N_FFT, hop_length:int=HOP_LENGTH) -> None:
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+
+    def __call__(self, y:np.ndarray) -> np.ndarray:
+        return librosa.stft(y, n_fft=self.n_fft, hop_length=self.hop_length)
+
+class FastSTFT:
+    """Lean stft backend that reproduces librosa.stft (hann window, center=True, zero padding)
+    without its per-call validation and window construction.
+    The window is computed once per dtype, frames are strided views of the padded signal 
+    and the transform is done by scipy.fft.rfft, which caches its plans for repeated snippet lengths.
+    Supports batches of signals along the leading dimensions, like librosa.stft.
+    """
+    def __init__(self, n_fft:int=N_FFT, hop_length:int=HOP_LENGTH, workers:int=1) -> None:
+        """Creates an instance of the FastSTFT backend.
+
+        Parameters
+        ----------
+        n_fft : int, optional
+            Length of the windowed signal, by default N_FFT
+        hop_length : int, optional
+            Number of samples between frames, by default HOP_LENGTH
+        workers : int, optional
+            Number of workers used by scipy.fft.rfft, by default 1
+        """
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.workers = workers
+        self.window = scipy.signal.get_window("hann", n_fft, fftbins=True)
+        self._windows = {} # Window cast to each input dtype, so that float32 input is not upcast
+
+    def __call__(self, y:np.ndarray) -> np.ndarray:
+        window = self._windows.get(y.dtype)
+        if window is None:
+            window = self._windows[y.dtype] = self.window.astype(y.dtype)
+        padding = [(0, 0)] * (y.ndim - 1) + [(self.n_fft // 2, self.n_fft // 2)]
+        y_padded = np.pad(y, padding)
+        frames = np.lib.stride_tricks.sliding_window_view(y_padded, self.n_fft, axis=-1)[..., ::self.hop_length, :]
+        stft = scipy.fft.rfft(frames * window, axis=-1, workers=self.workers)
+        return np.swapaxes(stft, -1, -2) # (..., n_bins, n_frames), as returned by librosa
+
+STFT_BACKENDS = {
+    "librosa": LibrosaSTFT,
+    "fast": FastSTFT,
+}
+
+def get_stft_backend(backend:Union[str, Callable, None]=None, **kwargs) -> Callable[[np.ndarray], np.ndarray]:
+    """Returns an stft backend from the registry.
+
+    Parameters
+    ----------
+    backend : Union[str, Callable, None], optional
+        Name of a registered backend ('librosa' or 'fast'), an already created backend 
+        (any callable mapping a signal to its complex stft), or None for the librosa reference.
+    **kwargs
+        Passed to the backend's constructor if a name is given, e.g. workers=4 for 'fast'.
+
+    Returns
+    -------
+    Callable[[np.ndarray], np.ndarray]
+        Function that calculates the complex stft of a signal.
+
+    Raises
+    ------
+    ValueError
+        If no backend with the given name is registered.
+    """
+    if backend is None:
+        backend = "librosa"
+    if callable(backend):
+        return backend
+    if backend not in STFT_BACKENDS:
+        raise ValueError(f"stft backend '{backend}' not found. Known backends: {list(STFT_BACKENDS)}.")
+    return STFT_BACKENDS[backend](**kwargs)
@@ -1,8 +1,36 @@
 import librosa
 import numpy as np
 
+from .stft import N_FFT, get_stft_backend
+
 class Target():
-    def __init__(self, y, onsets=None, calc_stft=True) -> None:
+    def __init__(self, y, onsets=None, calc_stft=True, compact:bool=False, dtype=None, mmap_path:str=None, stft_backend=None) -> None:
+        """Target piece that is being approximated, split into snippets at its onsets.
+
+        Parameters
+        ----------
+        y : np.ndarray
+            Signal of the target piece.
+        onsets : Union[np.ndarray, list], optional
+            Positions of onsets (in samples). Estimated with librosa if None.
+        calc_stft : bool, optional
+            If True, calculates the stft of every onset snippet, by default True.
+        compact : bool, optional
+            If True, only the time-averaged magnitude spectrum of each snippet is kept (self.spectral_profiles)
+            and the full stft matrices are dropped, by default False.
+            stft_per_snippet and abs_stft_per_snippet stay empty in this mode.
+        dtype : np.dtype, optional
+            If given, the signal is cast to this precision before any stft is calculated
+            and the spectral profiles are stored with it, e.g. np.float32.
+        mmap_path : str, optional
+            If given, the spectral profiles are written to this file and memory-mapped read-only.
+        stft_backend : Union[str, Callable], optional
+            stft backend used for the target snippets and for evaluating individuals against this target,
+            see stft.get_stft_backend. Uses librosa.stft if None.
+        """
+        self.stft_backend = get_stft_backend(stft_backend)
+        if dtype is not None:
+            y = np.asarray(y, dtype=dtype)
         self.y = y
         if onsets is None:
             # self.onsets = librosa.onset.onset_detect(y=y, units="samples")
@@ -10,12 +38,21 @@ class Target():
         else:
             self.onsets = onsets
         # self.stft_per_snippet = self.calc_stft_for_snippets() # Dict with onset: stft pairs
-        if calc_stft:
+        if calc_stft and not compact:
             self.stft_per_snippet = self.calc_stft_for_snippets_adaptive() # Dict with onset: stft pairs
             self.abs_stft_per_snippet = {onset: np.abs(self.stft_per_snippet[onset]) for onset in self.onsets}
-        else:  
+        else:
             self.stft_per_snippet = dict()
             self.abs_stft_per_snippet = dict()
+        if calc_stft and compact:
+            spectral_profiles = self.calc_spectral_profiles_compact()
+        else:
+            spectral_profiles = self.calc_spectral_profiles()
+        if dtype is not None:
+            spectral_profiles = spectral_profiles.astype(dtype, copy=False)
+        if mmap_path is not None:
+            spectral_profiles = self._to_memmap(spectral_profiles, mmap_path)
+        self.spectral_profiles = spectral_profiles # Matrix of time-averaged magnitude spectra, one row per onset
 
     def detect_onsets(self):
         y = librosa.resample(y=self.y, orig_sr=22050, target_sr=11025)
@@ -30,20 +67,61 @@ class Target():
             if i + 1 < len(self.onsets):
                 next_onset = self.onsets[i+1]
                 snippet = self.y[onset:next_onset]
-                stft_per_snippet[onset] = librosa.stft(snippet)
+                stft_per_snippet[onset] = self.stft_backend(snippet)
             else:
                 # final onset until end of piece
                 snippet = self.y[onset:]
-                stft_per_snippet[onset] = librosa.stft(snippet)
+                stft_per_snippet[onset] = self.stft_backend(snippet)
         return stft_per_snippet
 
     def calc_stft_for_snippets_adaptive(self):
         # Version with snippets of length min(onset_n-1 - onset_n, 1, len(song) - onset_n)
         stft_per_snippet = dict()
+        for onset, outset in self._adaptive_snippet_bounds():
+            stft_per_snippet[onset] = self.stft_backend(self.y[onset:outset])
+        return stft_per_snippet
+
+    def _adaptive_snippet_bounds(self):
+        """Yields (onset, outset) pairs of the snippets used by calc_stft_for_snippets_adaptive.
+        """
         for i, onset in enumerate(self.onsets[:-1]):
             outset = int(min(self.onsets[i+1], onset + 22050))
-            stft_per_snippet[onset] = librosa.stft(self.y[onset:outset])
+            yield onset, outset
         # Final onset
         final_onset = self.onsets[-1]
-        stft_per_snippet[final_onset] = librosa.stft(self.y[final_onset:(final_onset+int(min(len(self.y) - final_onset, final_onset + 22050)))])
-        return stft_per_snippet
\ No newline at end of file
+        yield final_onset, (final_onset+int(min(len(self.y) - final_onset, final_onset + 22050)))
+
+    def calc_spectral_profiles(self) -> np.ndarray:
+        """Stacks the time-averaged magnitude spectra of all onset snippets,
+        which is all the cosh distance needs from the target.
+
+        Returns
+        -------
+        np.ndarray
+            Matrix of shape (n_onsets, n_bins). Row i belongs to self.onsets[i].
+        """
+        if len(self.abs_stft_per_snippet) == 0:
+            return np.empty((0, 1 + N_FFT // 2))
+        return np.stack([np.average(self.abs_stft_per_snippet[onset], axis=1) for onset in self.onsets])
+
+    def calc_spectral_profiles_compact(self) -> np.ndarray:
+        """Same result as calc_spectral_profiles, but calculated snippet by snippet
+        without keeping the stft matrices in memory.
+
+        Returns
+        -------
+        np.ndarray
+            Matrix of shape (n_onsets, n_bins). Row i belongs to self.onsets[i].
+        """
+        profiles = {onset: np.average(np.abs(self.stft_backend(self.y[onset:outset])), axis=1) for onset, outset in self._adaptive_snippet_bounds()}
+        return np.stack([profiles[onset] for onset in self.onsets])
+
+    @staticmethod
+    def _to_memmap(array:np.ndarray, path:str) -> np.ndarray:
+        """Writes an array to an .npy file and returns a read-only memory map of it.
+        """
+        mmap = np.lib.format.open_memmap(path, mode='w+', dtype=array.dtype, shape=array.shape)
+        mmap[:] = array
+        mmap.flush()
+        del mmap
+        return np.load(path, mmap_mode='r')
@@ -1,5 +1,4 @@
 from multiprocessing import Process, Manager
-from multiprocessing.managers import BaseManager
 from glob import glob
 import pickle
 
@@ -13,7 +12,7 @@ from evoaudio.fitness import fitness_cached
 from evoaudio.individual import BaseIndividual
 from evoaudio.mutations import Mutator
 from evoaudio.population import Population, ArchiveRecord
-from evoaudio.sample_library import SampleLibrary
+from evoaudio.sample_library import SampleLibrary, SharedSampleLibrary
 from evoaudio.target import Target
 from evoaudio.jaccard import calc_and_save_jaccard, calc_jaccard_for_chord_approximation
 
@@ -31,9 +30,6 @@ ZETA = 0.9954
 PITCH_SHIFT_STD = 15
 MAX_PROCESSES = 10
 
-class LibraryManager(BaseManager):
-    pass
-
 class Logger():
     def __init__(self, annotation) -> None:
         self.annotation = annotation
@@ -75,7 +71,7 @@ def run_experiment(annotations:list[tuple[str, str]], target_individuals:list[Ba
                 instrument, style = sample_lib.get_random_instrument_for_pitch(pitch=pitch)
                 individual.samples[k] = sample_lib.get_sample(instrument=instrument, style=style, pitch=pitch)
             individual.fitness = fitness_cached(individual, target.abs_stft_per_snippet[0])
-            individual.fitness_per_onset.append(individual.fitness)
+            individual.fitness_per_onset = np.append(individual.fitness_per_onset, individual.fitness)
             pop.insert_individual(individual)
         pop.init_archive(onsets=[0])
     # Only allow the mutate_pitch mutation
@@ -95,9 +91,7 @@ def run_experiment(annotations:list[tuple[str, str]], target_individuals:list[Ba
         fitnesses.append(logger.logged_fitnesses)
 
 if __name__ == "__main__":
-        LibraryManager.register('SampleLibrary', SampleLibrary)
-        with LibraryManager() as manager:
-            shared_lib = manager.SampleLibrary()
+        with SharedSampleLibrary() as shared_lib:
             # Create sample set
             true_individuals, annotations = create_sample_set(shared_lib)
             for pitch_offset in range(13):
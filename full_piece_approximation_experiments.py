@@ -1,14 +1,13 @@
 from csv import DictWriter
 from glob import glob
 from multiprocessing import Process, Manager
-from multiprocessing.managers import BaseManager
 import os
 
 import numpy as np
 import librosa
 from parsing.arff_parsing import parse_arff
 
-from evoaudio.sample_library import SampleLibrary
+from evoaudio.sample_library import SampleLibrary, SharedSampleLibrary
 from evoaudio.base_algorithms import approximate_piece
 from evoaudio.population import Population, ArchiveRecord
 from evoaudio.population_logging import CombinedLogger
@@ -35,9 +34,6 @@ MAX_PROCESSES = 10
 
 PARAM_STR = f"{POPSIZE}_{N_OFFSPRING}_{MAX_STEPS}_{ONSET_FRAC}_{ALPHA}_{BETA}_{L_BOUND}_{U_BOUND}_{ZETA}_{PITCH_SHIFT_STD}_{N_RUNS}_1sec_convlog"
 
-class LibraryManager(BaseManager):
-    pass
-
 def create_sample_set():
     # Create sample set
     mixes = {file.split('_mix.mp3')[0][-4:]: librosa.load(file) for file in glob("./audio/tiny_aam/audio-mixes-mp3/*.mp3")}
@@ -45,11 +41,9 @@ def create_sample_set():
     return annotations, mixes
 
 def get_valid_sample(sample_lib, instrument, pitch):
-    # Retrying until valid style is found for pitch
-    try:
-        return sample_lib.get_sample(instrument=instrument, pitch=pitch)
-    except:
-        return get_valid_sample(sample_lib, instrument, pitch)
+    # Random style that has a sample of the pitch
+    style = sample_lib.get_random_style_for_pitch(instrument, pitch)
+    return sample_lib.get_sample(instrument=instrument, style=style, pitch=pitch)
 
 def run_experiment(annotations, target_mixes, sample_lib:SampleLibrary, run_id, proc_id):
     os.makedirs(RESULT_FOLDER + PARAM_STR + "/" + f"{run_id + proc_id}", exist_ok=True)
@@ -68,9 +62,7 @@ def run_experiment(annotations, target_mixes, sample_lib:SampleLibrary, run_id,
         logger.to_csv(RESULT_FOLDER + PARAM_STR + "/" + f"{run_id + proc_id}/" + name + ".csv")
     
 if __name__ == "__main__":
-    LibraryManager.register('SampleLibrary', SampleLibrary)
-    with LibraryManager() as manager:
-        shared_lib = manager.SampleLibrary()
+    with SharedSampleLibrary() as shared_lib:
         annotations, target_mixes = create_sample_set()
         finished_runs = 0
         while finished_runs < N_RUNS:
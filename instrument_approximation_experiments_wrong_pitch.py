@@ -1,10 +1,9 @@
 from csv import DictWriter
 from multiprocessing import Process, Manager
-from multiprocessing.managers import BaseManager
 
 import numpy as np
 
-from evoaudio.sample_library import SampleLibrary
+from evoaudio.sample_library import SampleLibrary, SharedSampleLibrary
 from evoaudio.base_algorithms import approximate_piece
 from evoaudio.population import Population, ArchiveRecord
 from evoaudio.mutations import Mutator
@@ -28,9 +27,6 @@ N_RUNS = 100
 MAX_PROCESSES = 20
 PITCH_OFFSET = 1 # Offset in half-steps
 
-class LibraryManager(BaseManager):
-    pass
-
 def create_sample_set(sample_lib):
     # Create sample set
     target_chords = [
@@ -55,11 +51,9 @@ def create_sample_set(sample_lib):
     return target_chords, target_mixes, target_individuals
 
 def get_valid_sample(sample_lib, instrument, pitch):
-    # Retrying until valid style is found for pitch
-    try:
-        return sample_lib.get_sample(instrument=instrument, pitch=pitch)
-    except:
-        return get_valid_sample(sample_lib, instrument, pitch)
+    # Random style that has a sample of the pitch
+    style = sample_lib.get_random_style_for_pitch(instrument, pitch)
+    return sample_lib.get_sample(instrument=instrument, style=style, pitch=pitch)
 
 def run_experiment(target_chords, target_mixes, target_individuals, sample_lib:SampleLibrary, errors, proc_id):
     results = []
@@ -74,7 +68,7 @@ def run_experiment(target_chords, target_mixes, target_individuals, sample_lib:S
                 instrument, style = sample_lib.get_random_instrument_for_pitch(pitch=pitch)
                 individual.samples[k] = sample_lib.get_sample(instrument=instrument, style=style, pitch=pitch)
             individual.fitness = fitness(target_mixes[i], individual.to_mixdown())
-            individual.fitness_per_onset.append(individual.fitness)
+            individual.fitness_per_onset = np.append(individual.fitness_per_onset, individual.fitness)
             pop.insert_individual(individual)
     # Only allow the mutate_pitch mutation
     mutator = Mutator(sample_library=sample_lib, alpha=ALPHA, beta=BETA, l_bound=L_BOUND, u_bound=U_BOUND, choose_mutation_p=[0, 1, 0, 0]) 
@@ -89,9 +83,7 @@ if __name__ == "__main__":
     manager = Manager()
     errors = manager.list()
 
-    LibraryManager.register('SampleLibrary', SampleLibrary)
-    with LibraryManager() as manager:
-        shared_lib = manager.SampleLibrary()
+    with SharedSampleLibrary() as shared_lib:
         target_chords, target_mixes, target_individuals = create_sample_set(shared_lib)
         
         finished_runs = 0
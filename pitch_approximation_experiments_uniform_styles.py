@@ -1,10 +1,9 @@
 from csv import DictWriter
 from multiprocessing import Process, Manager
-from multiprocessing.managers import BaseManager
 
 import numpy as np
 
-from evoaudio.sample_library import SampleLibrary
+from evoaudio.sample_library import SharedSampleLibrary
 from evoaudio.base_algorithms import approximate_piece
 from evoaudio.population import Population, ArchiveRecord
 from evoaudio.mutations import Mutator
@@ -27,9 +26,6 @@ PITCH_SHIFT_STD = 15
 N_RUNS = 100
 MAX_PROCESSES = 10
 
-class LibraryManager(BaseManager):
-    pass
-
 def create_sample_set(sample_lib):
     # Create sample set
     target_chords = [
@@ -52,9 +48,11 @@ def create_sample_set(sample_lib):
     return target_chords, target_mixes
 
 def get_valid_sample(sample_lib, instrument):
+    # Pitch and style are drawn independently and redrawn until they match.
+    # Keeps the sampling distribution of the published runs, do not replace with a single draw
     try:
         return sample_lib.get_sample(instrument=instrument, pitch=sample_lib.get_random_pitch_for_instrument_uniform(instrument, sample_lib.get_random_style_for_instrument(instrument)))
-    except:
+    except KeyError:
         return get_valid_sample(sample_lib, instrument)
 
 def run_experiment(target_chords, target_mixes, sample_lib, errors, proc_id):
@@ -68,7 +66,7 @@ def run_experiment(target_chords, target_mixes, sample_lib, errors, proc_id):
             for note in target_chords[i]:
                 individual.samples.append(get_valid_sample(sample_lib, note[0]))
             individual.fitness = fitness(target_mixes[i], individual.to_mixdown())
-            individual.fitness_per_onset.append(individual.fitness)
+            individual.fitness_per_onset = np.append(individual.fitness_per_onset, individual.fitness)
             pop.insert_individual(individual)
     # Only allow the mutate_pitch mutation
     mutator = Mutator(sample_library=sample_lib, alpha=ALPHA, beta=BETA, l_bound=L_BOUND, u_bound=U_BOUND, choose_mutation_p=[0, 0, 1]) 
@@ -98,9 +96,7 @@ if __name__ == "__main__":
     manager = Manager()
     errors = manager.list()
 
-    LibraryManager.register('SampleLibrary', SampleLibrary)
-    with LibraryManager() as manager:
-        shared_lib = manager.SampleLibrary()
+    with SharedSampleLibrary() as shared_lib:
         target_chords, target_mixes = create_sample_set(shared_lib)
 
         finished_runs = 0